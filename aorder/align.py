@@ -0,0 +1,108 @@
+# encoding: UTF-8
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+from store import as_bars, to_epoch_ns
+
+FILL_FLAGS = ['OutOfRange', 'InGap', 'PriceOutside']
+ALIGN_COLUMNS = (['entryBar', 'exitBar'] +
+                 [side + flag for side in ('entry', 'exit') for flag in FILL_FLAGS] +
+                 ['badFill'])
+GAP_FACTOR = 1.5
+
+
+def bar_interval(datetimes):
+    """ Typical bar length in ns, the median spacing of the first bars. """
+    if len(datetimes) < 2:
+        return 0
+    return int(np.median(np.diff(datetimes[:10001])))
+
+
+def is_gap(spacing, step, gap_factor=GAP_FACTOR):
+    """ Session gap rule shared with timeaxis.TimeIndex: consecutive bars more than gap_factor steps apart. """
+    return spacing > step * gap_factor
+
+
+def align_fills(bars, times, prices, step=None, tolerance=0.0, gap_factor=GAP_FACTOR):
+    """ Match fills to the bar holding them, the last bar starting at or before the fill.
+
+    Returns the bar index (clipped into the data) and three flags: the fill is
+    before the first bar or after the last one ends, it falls in the session
+    gap following its bar (see is_gap) after the bar ended, or its price is
+    outside that bar's low..high. `step` is the bar interval, see bar_interval.
+    """
+    times = to_epoch_ns(times)
+    n = len(bars)
+    if n == 0:
+        none = np.zeros(len(times), dtype=bool)
+        return np.zeros(len(times), dtype=np.int64), ~none, none, none
+    datetimes = bars.datetime
+    step = bar_interval(datetimes) if step is None else step
+
+    i = datetimes.searchsorted(times, side='right') - 1
+    out = (i < 0) | (times >= datetimes[-1] + step)
+    bar = np.clip(i, 0, n - 1)
+    following = np.minimum(bar + 1, n - 1)
+    gap = ~out & (times >= datetimes[bar] + step) & is_gap(datetimes[following] - datetimes[bar], step, gap_factor)
+    # compare in the bars' precision, float32 store prices are rounded
+    low, high = np.asarray(bars.low)[bar], np.asarray(bars.high)[bar]
+    prices = np.asarray(prices).astype(low.dtype)
+    outside = ~out & ((prices < low - tolerance) | (prices > high + tolerance))
+    return bar, out, gap, outside
+
+
+def align_orders(bars, orders, tolerance=0.0, step=None, gap_factor=GAP_FACTOR):
+    """ A copy of the orders table with ALIGN_COLUMNS added, in one vectorized pass.
+
+    entryBar/exitBar index the bar holding each fill; the flag columns mark
+    fills outside the data, in session gaps, or at prices the bar never
+    traded; badFill is any of them. Charts draw bad fills with their own
+    marker instead of dropping them. Charts pass the step and gap_factor of
+    their TimeIndex, so the flags agree with the gaps on the time axis.
+    """
+    bars = as_bars(bars)
+    step = bar_interval(bars.datetime) if step is None else step
+    orders = orders.copy()
+    bad = np.zeros(len(orders), dtype=bool)
+    for side in ('entry', 'exit'):
+        columns = align_fills(bars, orders[side + 'Dt'].values, orders[side + 'Price'].values, step, tolerance,
+                              gap_factor)
+        orders[side + 'Bar'] = columns[0]
+        for flag, values in zip(FILL_FLAGS, columns[1:]):
+            orders[side + flag] = values
+            bad |= values
+    orders['badFill'] = bad
+    return orders
+
+
+def remap_orders(bars, orders):
+    """ Aligned orders with entryBar/exitBar moved to another bar series of the same data, by time.
+
+    The flags are kept, so switching a chart's interval costs one searchsorted
+    per fill instead of a new alignment.
+    """
+    last = max(len(bars) - 1, 0)
+    columns = {}
+    for side in ('entry', 'exit'):
+        i = bars.datetime.searchsorted(to_epoch_ns(orders[side + 'Dt'].values), side='right') - 1
+        columns[side + 'Bar'] = np.clip(i, 0, last)
+    return orders.assign(**columns)
+
+
+def add_orders(bars, orders, new, tolerance=0.0, step=None, gap_factor=GAP_FACTOR):
+    """ Aligned orders with the new orders aligned to the current bars and appended. """
+    new = align_orders(bars, new, tolerance, step, gap_factor)
+    if orders is None or orders.empty:
+        return new
+    if not is_aligned(orders):
+        orders = align_orders(bars, orders, tolerance, step, gap_factor)
+    return pd.concat([orders, new], ignore_index=True)
+
+
+def is_aligned(orders):
+    """ Whether every row carries the align columns, e.g. not after concatenating raw orders. """
+    return (orders is not None and all(column in orders.columns for column in ALIGN_COLUMNS) and
+            not orders[ALIGN_COLUMNS].isnull().values.any())
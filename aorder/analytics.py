@@ -0,0 +1,133 @@
+# encoding: UTF-8
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+from align import is_aligned
+from store import as_bars, to_epoch_ns
+
+NS_PER_HOUR = 3600 * 10 ** 9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+def trade_bar_range(bars, orders):
+    """ Index of the bar holding each trade's entry and exit (the last bar starting at or before it). """
+    if is_aligned(orders):
+        return orders.entryBar.values, orders.exitBar.values
+    entry = bars.datetime.searchsorted(to_epoch_ns(orders.entryDt.values), side='right') - 1
+    exit = bars.datetime.searchsorted(to_epoch_ns(orders.exitDt.values), side='right') - 1
+    return np.clip(entry, 0, None), np.clip(exit, 0, None)
+
+
+def excursions(bars, orders, entry=None, exit=None):
+    """ Maximum adverse and favourable excursion of every trade, in price units.
+
+    The low/high over each trade's bar range comes from one vectorized walk of
+    the bar pyramid for all trades together.
+    """
+    if entry is None:
+        entry, exit = trade_bar_range(bars, orders)
+    low = bars.pyramid.range_low_many(entry, exit + 1)
+    high = bars.pyramid.range_high_many(entry, exit + 1)
+    price = orders.entryPrice.values
+    is_long = orders.volume.values > 0
+    mae = np.where(is_long, price - low, high - price)
+    mfe = np.where(is_long, high - price, price - low)
+    return mae, mfe
+
+
+def holding_time(orders):
+    """ Holding time of every trade in seconds. """
+    return (to_epoch_ns(orders.exitDt.values) - to_epoch_ns(orders.entryDt.values)) / 1e9
+
+
+def pnl_by_hour(orders):
+    """ Total pnl by entry hour, index 0-23. """
+    hour = (to_epoch_ns(orders.entryDt.values) // NS_PER_HOUR) % 24
+    return np.bincount(hour, weights=orders.pnl.values, minlength=24)
+
+
+def pnl_by_weekday(orders):
+    """ Total pnl by entry weekday, Monday = 0. """
+    # 1970-01-01 was a Thursday
+    weekday = (to_epoch_ns(orders.entryDt.values) // NS_PER_DAY + 3) % 7
+    return np.bincount(weekday, weights=orders.pnl.values, minlength=7)
+
+
+def drawdown(pnl):
+    """ Equity curve (cumulative pnl) and its drawdown from the running peak. """
+    equity = np.cumsum(pnl)
+    return equity, equity - np.maximum.accumulate(np.maximum(equity, 0))
+
+
+def streaks(pnl):
+    """ Signed length of the win (+) or loss (-) streak each trade belongs to, plus the longest of each.
+
+    A zero-pnl trade is neither and breaks both streaks; its own value is 0.
+    """
+    pnl = np.asarray(pnl)
+    if len(pnl) == 0:
+        return np.empty(0, dtype=np.int64), 0, 0
+    sign = np.sign(pnl)
+    run = np.cumsum(np.concatenate(([0], sign[1:] != sign[:-1])))
+    lengths = np.bincount(run)[run]
+    signed = (sign * lengths).astype(np.int64)
+    return signed, int(max(signed.max(), 0)), int(max(-signed.min(), 0))
+
+
+def analyse(bars, orders):
+    """ Per-trade analytics table, in exit-time order, and a summary dict. """
+    bars = as_bars(bars)
+    orders = orders.iloc[np.argsort(to_epoch_ns(orders.exitDt.values), kind='mergesort')]
+    entry, exit = trade_bar_range(bars, orders)
+    mae, mfe = excursions(bars, orders, entry, exit)
+    equity, dd = drawdown(orders.pnl.values)
+    streak, longest_win, longest_loss = streaks(orders.pnl.values)
+    table = pd.DataFrame({'entryBar': entry, 'exitBar': exit, 'pnl': orders.pnl.values, 'mae': mae, 'mfe': mfe,
+                          'holding': holding_time(orders), 'equity': equity, 'drawdown': dd, 'streak': streak},
+                         index=orders.index)
+    summary = {'trades': len(orders),
+               'holdingHistogram': np.histogram(table.holding.values, bins=20),
+               'maxDrawdown': float(dd.min()) if len(dd) else 0.0,
+               'longestWinStreak': longest_win,
+               'longestLossStreak': longest_loss,
+               'pnlByHour': pnl_by_hour(orders),
+               'pnlByWeekday': pnl_by_weekday(orders)}
+    return table, summary
+
+
+def trade_technicals(bars, orders):
+    """ Analytics as plot_trade technicals, one value per bar.
+
+    Realized equity, drawdown and MAE/MFE at each exit bar; the holding time
+    (minutes) of the trades last closed, as a step line; and the pnl
+    distribution by entry hour and weekday, shown at every bar of that hour
+    and weekday so profitable sessions stand out on the chart. No trades
+    (None, or an empty frame as a backtest without trades gives) show no panes.
+    """
+    if orders is None or orders.empty:
+        return []
+    bars = as_bars(bars)
+    length = len(bars)
+    table, summary = analyse(bars, orders)
+    exit = table.exitBar.values
+    equity = np.cumsum(np.bincount(exit, weights=table.pnl.values, minlength=length))
+    dd = equity - np.maximum.accumulate(np.maximum(equity, 0))
+    mfe = np.bincount(exit, weights=table.mfe.values, minlength=length)
+    mae = np.bincount(exit, weights=table.mae.values, minlength=length)
+
+    count = np.bincount(exit, minlength=length)
+    total = np.bincount(exit, weights=table.holding.values / 60, minlength=length)
+    closed = np.maximum.accumulate(np.where(count > 0, np.arange(length), -1))
+    holding = np.where(closed >= 0, total[closed] / np.maximum(count[closed], 1), 0.0)
+
+    hour = (bars.datetime // NS_PER_HOUR) % 24
+    weekday = (bars.datetime // NS_PER_DAY + 3) % 7
+    return [('equity', 1, [equity]),
+            ('drawdown', 1, [dd]),
+            ('mae/mfe', 1, [mfe, -mae]),
+            ('holding time', 1, [holding]),
+            ('pnl by hour', 1, [summary['pnlByHour'][hour]]),
+            ('pnl by weekday', 1, [summary['pnlByWeekday'][weekday]])]
@@ -0,0 +1,58 @@
+// Decodes the compact figures sent by dash_plot.encode_figure: arrays arrive
+// as {dtype, bdata} base64 buffers and are turned back into typed arrays.
+(function () {
+    var TYPES = {f4: Float32Array, f8: Float64Array, i4: Int32Array, u1: Uint8Array};
+
+    function decodeArray(spec) {
+        var raw = atob(spec.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        var values = new TYPES[spec.dtype](bytes.buffer);
+        if (spec.palette) {
+            var colors = new Array(values.length);
+            for (var j = 0; j < values.length; j++) {
+                colors[j] = spec.palette[values[j]];
+            }
+            return colors;
+        }
+        if (spec.epoch !== undefined) {
+            // seconds relative to `epoch`, to epoch milliseconds for a date axis
+            var times = new Float64Array(values.length);
+            for (var k = 0; k < values.length; k++) {
+                times[k] = (spec.epoch + values[k]) * 1000;
+            }
+            return times;
+        }
+        return values;
+    }
+
+    function decode(node) {
+        if (Array.isArray(node)) {
+            return node.map(decode);
+        }
+        if (node !== null && typeof node === 'object') {
+            if (node.bdata !== undefined) {
+                return decodeArray(node);
+            }
+            var out = {};
+            for (var key in node) {
+                out[key] = decode(node[key]);
+            }
+            return out;
+        }
+        return node;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        aorder: {
+            decode_figure: function (payload) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                return decode(payload);
+            }
+        }
+    });
+})();
@@ -0,0 +1,94 @@
+# encoding: UTF-8
+
+import traceback
+
+from pyqtgraph.Qt import QtCore
+
+from align import align_orders
+from filters import OrderIndex
+from indicators import Indicator, IndicatorSet
+from store import as_bars
+
+
+def _resolve(source, *args):
+    # sources are data or a callable producing it
+    return source(*args) if callable(source) else source
+
+
+class ChartLoader(QtCore.QObject):
+    """ Prepares a chart's data in a worker thread, see TradeChart.load.
+
+    The bars are handed over as growing suffixes, most recent first, each
+    with its pyramid already built; then the orders, aligned to the bars
+    and with their filter index; then the technicals with their indicators computed; then `loaded`,
+    unless it failed or was stopped. Every result reaches the GUI thread as a queued signal, so the
+    window stays responsive.
+
+    Args:
+      bars: a bar DataFrame or store.Bars, or a callable loading one
+      orders: an orders DataFrame, or a callable producing one (e.g. running the backtest)
+      technicals: technicals as for plot_trade, or a callable technicals(bars, orders)
+      recent: bars in the first slice; each following slice is `growth` times longer
+    """
+
+    bars_ready = QtCore.Signal(object)
+    orders_ready = QtCore.Signal(object)
+    technicals_ready = QtCore.Signal(object)
+    loaded = QtCore.Signal()
+    failed = QtCore.Signal(object)
+
+    def __init__(self, bars, orders=None, technicals=None, recent=20000, growth=8):
+        super(ChartLoader, self).__init__()
+        self.bars = bars
+        self.orders = orders
+        self.technicals = technicals
+        self.recent = recent
+        self.growth = growth
+        self._stopped = False
+        self.thread = QtCore.QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """ Stop after the current step (a running backtest is not interrupted) and wait for the thread. """
+        self._stopped = True
+        self.thread.quit()
+        self.thread.wait()
+
+    def run(self):
+        try:
+            bars = as_bars(_resolve(self.bars))
+            size = min(self.recent, len(bars))
+            while True:
+                part = bars if size >= len(bars) else bars.tail(size)
+                part.pyramid  # built here rather than in the GUI thread
+                self.bars_ready.emit(part)
+                if part is bars or self._stopped:
+                    break
+                size *= self.growth
+            if self._stopped:
+                return
+
+            orders = _resolve(self.orders)
+            if orders is not None:
+                index = None
+                if not orders.empty:
+                    orders = align_orders(bars, orders)
+                    index = OrderIndex(orders)
+                self.orders_ready.emit((orders, index))
+            if self._stopped:
+                return
+
+            technicals = _resolve(self.technicals, bars, orders)
+            if technicals:
+                IndicatorSet(t for _, _, tech in technicals for t in tech if isinstance(t, Indicator)).batch(bars)
+                self.technicals_ready.emit(technicals)
+            self.loaded.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(e)
+        finally:
+            self.thread.quit()
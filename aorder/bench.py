@@ -0,0 +1,208 @@
+# encoding: UTF-8
+
+"""
+性能测试：在合成数据上测量图表和数据路径，不需要Mongo和vnpy。每个规模在单独的进程中运行，峰值内存互不影响。
+
+python bench.py --sizes 10000,100000,1000000 --save baseline.json
+python bench.py --sizes 10000,100000,1000000 --compare baseline.json
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import numpy as np
+
+from render import use_offscreen
+from synthetic import synthetic_bars, synthetic_orders, write_trades_csv
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+
+def peak_rss_mb():
+    """ Peak resident memory of this process in MB, None where it cannot be measured. """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return rss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    # the peak working set, Windows only
+    peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    return peak / (1024.0 * 1024) if peak is not None else None
+
+
+def timed(fn, args_list):
+    """ Seconds taken by fn(*args) for each args in args_list. """
+    seconds = np.empty(len(args_list))
+    for i, args in enumerate(args_list):
+        start = timer()
+        fn(*args)
+        seconds[i] = timer() - start
+    return seconds
+
+
+def summarize(seconds, items=1):
+    """ Throughput in items per second and latency percentiles in milliseconds. """
+    ms = np.asarray(seconds) * 1000
+    return {'calls': len(ms),
+            'throughput': items * len(ms) / max(ms.sum() / 1000, 1e-12),
+            'p50': float(np.percentile(ms, 50)),
+            'p95': float(np.percentile(ms, 95)),
+            'p99': float(np.percentile(ms, 99)),
+            'max': float(ms.max())}
+
+
+def bench_size(n, repeat=100, seed=0):
+    """ Time every benchmarked path on n synthetic bars; run in a fresh process. """
+    use_offscreen()
+    import pyqtgraph as pg
+    from pyqtgraph.Qt import QtCore
+    from trades import load_trades
+    from utils import TradeChart
+
+    app = pg.mkQApp()
+    rng = np.random.RandomState(seed)
+    df = synthetic_bars(n, seed=seed)
+    orders = synthetic_orders(df, max(n // 100, 10), seed=seed)
+    results = {}
+
+    def build():
+        chart = TradeChart(df, orders=orders)
+        chart.main_window.resize(1600, 1000)
+        chart.show()
+        app.processEvents()
+        return chart
+
+    start = timer()
+    chart = build()
+    results['construct'] = summarize([timer() - start], n)
+
+    # filter slider steps, through the Qt signal and a repaint
+    low = chart.main_window.filter.low_slider
+
+    def slide(value):
+        low.setValue(value)
+        app.processEvents()
+
+    results['update_orders'] = summarize(timed(slide, [(v,) for v in rng.randint(0, 100, repeat)]))
+    low.setValue(0)
+
+    # region moves, each rescaling the main and volume charts
+    width = min(500, n // 2)
+
+    def move(left):
+        chart.region.setRegion([left, left + width])
+        app.processEvents()
+
+    results['region_update'] = summarize(timed(move, [(x,) for x in rng.randint(0, n - width, repeat)]))
+
+    # crosshair hovers inside a fixed window
+    move(n // 2)
+    vb = chart.p1.vb
+    mid = float(df.close.values[n // 2])
+
+    def hover(x):
+        chart.mouse_moved((vb.mapViewToScene(QtCore.QPointF(x, mid)),))
+
+    results['hover'] = summarize(timed(hover, [(x + 0.5,) for x in rng.randint(n // 2, n // 2 + width, repeat)]))
+    chart.close()
+
+    try:
+        from dash_plot import generate_graph
+    except ImportError:
+        results['generate_graph'] = None
+    else:
+        frame = df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close',
+                                   'volume': 'Volume'}).set_index('datetime')
+        results['generate_graph'] = summarize(timed(generate_graph, [(frame,)]), n)
+
+    tmp = tempfile.mkdtemp(prefix='aorder-bench-')
+    try:
+        trades = synthetic_orders(df, max(n // 10, 10), seed=seed)
+        path = write_trades_csv(trades, os.path.join(tmp, 'trades.csv'))
+        results['load_trades'] = summarize(timed(load_trades, [(path,)]), len(trades))
+    finally:
+        shutil.rmtree(tmp)
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def run(sizes=SIZES, repeat=100, seed=0):
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'results': {}}
+    for n in sizes:
+        with ProcessPoolExecutor(1) as pool:
+            report['results'][str(n)] = pool.submit(bench_size, n, repeat, seed).result()
+    return report
+
+
+def print_report(report):
+    for n, results in sorted(report['results'].items(), key=lambda item: int(item[0])):
+        rss = results['peak_rss_mb']
+        print('{} bars, peak RSS {}'.format(n, 'unavailable' if rss is None else '{:.0f} MB'.format(rss)))
+        for name, stats in sorted(results.items()):
+            if name == 'peak_rss_mb':
+                continue
+            if stats is None:
+                print('  {:<16} skipped'.format(name))
+                continue
+            print('  {:<16} {:>12.1f}/s  p50 {:8.2f}ms  p95 {:8.2f}ms  p99 {:8.2f}ms'.format(
+                name, stats['throughput'], stats['p50'], stats['p95'], stats['p99']))
+
+
+def compare(report, baseline, tolerance=0.2):
+    """ (size, name, baseline p95, current p95) of every path slower than the baseline by more than tolerance. """
+    regressions = []
+    for n, results in report['results'].items():
+        for name, stats in results.items():
+            old = baseline['results'].get(n, {}).get(name)
+            if name == 'peak_rss_mb':
+                if old and stats and stats > old * (1 + tolerance):
+                    regressions.append((n, name, old, stats))
+            elif stats and old and stats['p95'] > old['p95'] * (1 + tolerance):
+                regressions.append((n, name, old['p95'], stats['p95']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='aorder benchmarks')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in SIZES), help='bar counts, comma separated')
+    parser.add_argument('--repeat', type=int, default=100, help='calls per interactive path')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write the report as a JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run([int(n) for n in args.sizes.split(',')], args.repeat, args.seed)
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for n, name, old, new in regressions:
+            print('REGRESSION {} bars {}: {:.2f} -> {:.2f}'.format(n, name, old, new))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
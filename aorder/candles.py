@@ -0,0 +1,153 @@
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore, QtGui
+
+from colors import DOWN, UP
+from instrument import profiled, profiler
+
+
+class CandleStyle(object):
+    """ Pens and brushes indexed by the colour index from colors.py.
+
+    Built once per chart and shared by every candle and volume item.
+    """
+
+    def __init__(self, up='r', down='g'):
+        self.pens = (pg.mkPen(down), pg.mkPen(up))
+        self.brushes = (pg.mkBrush(down), pg.mkBrush(up))
+
+
+class LodItem(pg.GraphicsObject):
+    """ Base item that only draws the pyramid buckets of the visible x-range.
+
+    The picture covers the visible range plus half a screen on each side, so it
+    is rebuilt only when the view leaves that margin or the zoom level changes.
+    """
+
+    def __init__(self, pyramid, style=None, pixels_per_bucket=3):
+        super(LodItem, self).__init__()
+        self.pyramid = pyramid
+        self.style = style or CandleStyle()
+        self.pixels_per_bucket = pixels_per_bucket
+        self.picture = QtGui.QPicture()
+        self.tail_picture = QtGui.QPicture()
+        self._drawn = None
+
+    def viewRangeChanged(self):
+        self.refresh()
+
+    def viewTransformChanged(self):
+        self.refresh()
+
+    def refresh(self, force=False):
+        vb = self.getViewBox()
+        if vb is None or len(self.pyramid) == 0:
+            return
+        x0, x1 = vb.viewRange()[0]
+        px = self.pixelWidth()
+        if px == 0:
+            return
+        level = self.pyramid.level_for(px * self.pixels_per_bucket)
+        if not force and self._drawn is not None:
+            level_, start_, stop_ = self._drawn
+            if level_ == level and start_ <= x0 and x1 <= stop_:
+                return
+        margin = (x1 - x0) / 2.0
+        start = int(np.floor(x0 - margin))
+        stop = int(np.ceil(x1 + margin)) + 1
+        self._drawn = (level, start, stop)
+
+        # the bucket holding the last bar is drawn separately, so live updates
+        # of the last bar only repaint that bucket
+        tail = self._tail_start(level)
+        self.picture = self._render(start, min(stop, tail), level)
+        self.tail_picture = self._render(tail, stop, level) if tail < stop else QtGui.QPicture()
+        self.update()
+
+    def set_pyramid(self, pyramid):
+        """ Draw another bar series, e.g. the same data at another interval. """
+        self.pyramid = pyramid
+        self._drawn = None
+        self.prepareGeometryChange()
+        self.informViewBoundsChanged()
+        self.refresh(force=True)
+
+    def tail_changed(self, new_bar=False):
+        """ Called after a bar was appended or the last bar changed. """
+        self.prepareGeometryChange()
+        self.informViewBoundsChanged()
+        if self._drawn is None:
+            return
+        level, start, stop = self._drawn
+        tail = self._tail_start(level)
+        if tail >= stop:
+            return
+        if new_bar and tail == len(self.pyramid) - 1:
+            # a new bucket started, the previous tail bucket moves into the body
+            self.refresh(force=True)
+        else:
+            self.tail_picture = self._render(tail, stop, level)
+            self.update()
+
+    def _tail_start(self, level):
+        return ((len(self.pyramid) - 1) >> level) << level
+
+    @profiled('lod render')
+    def _render(self, start, stop, level):
+        if profiler.enabled:
+            profiler.count('buckets drawn', max(min(stop, len(self.pyramid)) - max(start, 0), 0) >> level)
+        picture = QtGui.QPicture()
+        p = QtGui.QPainter(picture)
+        self.draw(p, *self.pyramid.buckets(start, stop, level))
+        p.end()
+        return picture
+
+    def draw(self, p, x, width, open, high, low, close, volume, colors):
+        raise NotImplementedError
+
+    @profiled('paint')
+    def paint(self, p, *args):
+        self.picture.play(p)
+        self.tail_picture.play(p)
+
+
+class CandlestickItem(LodItem):
+
+    def draw(self, p, x, width, open, high, low, close, volume, colors):
+        w = width * 0.8
+        for color in (DOWN, UP):
+            mask = colors == color
+            if not mask.any():
+                continue
+            p.setPen(self.style.pens[color])
+            p.setBrush(self.style.brushes[color])
+            xs = x[mask]
+            wicks = pg.arrayToQPath(np.repeat(xs, 2),
+                                    np.column_stack((low[mask], high[mask])).ravel(),
+                                    connect='pairs')
+            p.drawPath(wicks)
+            for xi, o, c in zip(xs, open[mask], close[mask]):
+                p.drawRect(QtCore.QRectF(xi - w / 2.0, o, w, c - o))
+
+    def boundingRect(self):
+        if len(self.pyramid) == 0:
+            return QtCore.QRectF()
+        low, high = self.pyramid.low_min, self.pyramid.high_max
+        return QtCore.QRectF(-0.5, low, len(self.pyramid), high - low)
+
+
+class VolumeItem(LodItem):
+
+    def draw(self, p, x, width, open, high, low, close, volume, colors):
+        w = width * 0.8
+        p.setPen(pg.mkPen(None))
+        for color in (DOWN, UP):
+            mask = colors == color
+            p.setBrush(self.style.brushes[color])
+            for xi, v in zip(x[mask], volume[mask]):
+                p.drawRect(QtCore.QRectF(xi - w / 2.0, 0, w, v))
+
+    def boundingRect(self):
+        if len(self.pyramid) == 0:
+            return QtCore.QRectF()
+        return QtCore.QRectF(-0.5, 0, len(self.pyramid), self.pyramid.volume_max)
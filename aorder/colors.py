@@ -0,0 +1,22 @@
+import numpy as np
+
+DOWN = 0
+UP = 1
+
+
+def candle_colors(open, close):
+    """ Colour index per bar: UP where close >= open, DOWN otherwise. """
+    return (np.asarray(close) >= np.asarray(open)).view(np.uint8)
+
+
+def volume_colors(close):
+    """ Colour index per bar: UP where close rises above the previous close. """
+    close = np.asarray(close)
+    colors = np.zeros(len(close), dtype=np.uint8)
+    colors[1:] = close[1:] > close[:-1]
+    return colors
+
+
+def palette(colors, down, up):
+    """ Map a colour index array onto two colour values, e.g. for plotly markers. """
+    return np.array([down, up])[colors]
@@ -2,48 +2,38 @@
 
 from __future__ import division
 
+import base64
+from collections import OrderedDict
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
+from dash.dependencies import ClientsideFunction, Input, Output
+from dash.exceptions import PreventUpdate
 
 """
 展示如何执行策略回测。
 """
 
-from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine, MINUTE_DB_NAME
 import pandas as pd
-from utils import plot_candles, plot_trade
-import talib
+from colors import palette, volume_colors
+from data import load_bars
+from indicators import SMA, BollingerBands
+from pyramid import BarPyramid
 import numpy as np
 
-def generate_graph(df):
-    INCREASING_COLOR = '#17BECF'
-    DECREASING_COLOR = '#7F7F7F'
-
-    data = [dict(
-        type='candlestick',
-        open=df.Open,
-        high=df.High,
-        low=df.Low,
-        close=df.Close,
-        x=df.index,
-        yaxis='y2',
-        name='GS',
-        increasing=dict(line=dict(color=INCREASING_COLOR)),
-        decreasing=dict(line=dict(color=DECREASING_COLOR)),
-    )]
-
-    layout = dict()
+INCREASING_COLOR = '#17BECF'
+DECREASING_COLOR = '#7F7F7F'
 
-    fig = dict(data=data, layout=layout)
 
-    fig['layout'] = dict()
-    fig['layout']['plot_bgcolor'] = 'rgb(250, 250, 250)'
-    fig['layout']['xaxis'] = dict(rangeselector=dict(visible=True))
-    fig['layout']['yaxis'] = dict(domain=[0, 0.2], showticklabels=False)
-    fig['layout']['yaxis2'] = dict(domain=[0.2, 0.8])
-    fig['layout']['legend'] = dict(orientation='h', y=0.9, x=0.3, yanchor='bottom')
-    fig['layout']['margin'] = dict(t=40, b=40, r=40, l=40)
+def _layout():
+    layout = dict()
+    layout['plot_bgcolor'] = 'rgb(250, 250, 250)'
+    layout['xaxis'] = dict(rangeselector=dict(visible=True))
+    layout['yaxis'] = dict(domain=[0, 0.2], showticklabels=False)
+    layout['yaxis2'] = dict(domain=[0.2, 0.8])
+    layout['legend'] = dict(orientation='h', y=0.9, x=0.3, yanchor='bottom')
+    layout['margin'] = dict(t=40, b=40, r=40, l=40)
 
     rangeselector = dict(
         visibe=True,
@@ -69,61 +59,164 @@ def generate_graph(df):
             dict(step='all')
         ]))
 
-    fig['layout']['xaxis']['rangeselector'] = rangeselector
-
-    def movingaverage(interval, window_size=10):
-        window = np.ones(int(window_size)) / float(window_size)
-        return np.convolve(interval, window, 'same')
+    layout['xaxis']['rangeselector'] = rangeselector
+    return layout
 
-    mv_y = movingaverage(df.Close)
-    mv_x = list(df.index)
 
-    # Clip the ends
-    mv_x = mv_x[5:-5]
-    mv_y = mv_y[5:-5]
+def _encode_array(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        # int32 seconds from the first value, decoded to epoch ms on the client
+        seconds = values.astype('datetime64[s]').astype(np.int64)
+        epoch = int(seconds[0]) if len(seconds) else 0
+        return dict(dtype='i4', epoch=epoch, bdata=_b64(seconds - epoch, '<i4'))
+    if values.dtype.kind in 'OSU':
+        # colour strings travel as uint8 indexes into a palette
+        palette, index = np.unique(values, return_inverse=True)
+        return dict(dtype='u1', palette=[str(c) for c in palette], bdata=_b64(index, 'u1'))
+    return dict(dtype='f4', bdata=_b64(values, '<f4'))
 
-    fig['data'].append(dict(x=mv_x, y=mv_y, type='scatter', mode='lines',
-                            line=dict(width=1),
-                            marker=dict(color='#E377C2'),
-                            yaxis='y2', name='Moving Average'))
 
-    colors = []
+def _b64(values, dtype):
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
 
-    for i in range(len(df.Close)):
-        if i != 0:
-            if df.Close[i] > df.Close[i - 1]:
-                colors.append(INCREASING_COLOR)
-            else:
-                colors.append(DECREASING_COLOR)
-        else:
-            colors.append(DECREASING_COLOR)
-
-    fig['data'].append(dict(x=df.index, y=df.Volume,
-                            marker=dict(color=colors),
-                            type='bar', yaxis='y', name='Volume'))
-
-    def bbands(price, window_size=10, num_of_std=5):
-        rolling_mean = price.rolling(window=window_size).mean()
-        rolling_std = price.rolling(window=window_size).std()
-        upper_band = rolling_mean + (rolling_std * num_of_std)
-        lower_band = rolling_mean - (rolling_std * num_of_std)
-        return rolling_mean, upper_band, lower_band
 
-    bb_avg, bb_upper, bb_lower = bbands(df.Close)
+def encode_figure(fig):
+    """ Replace every numpy array of a figure by a base64 typed-array spec for assets/aorder.js. """
+    if isinstance(fig, dict):
+        return dict((key, encode_figure(value)) for key, value in fig.items())
+    if isinstance(fig, list):
+        return [encode_figure(value) for value in fig]
+    if isinstance(fig, np.ndarray):
+        return _encode_array(fig)
+    return fig
 
-    fig['data'].append(dict(x=df.index, y=bb_upper, type='scatter', yaxis='y2',
-                            line=dict(width=1),
-                            marker=dict(color='#ccc'), hoverinfo='none',
-                            legendgroup='Bollinger Bands', name='Bollinger Bands'))
 
-    fig['data'].append(dict(x=df.index, y=bb_lower, type='scatter', yaxis='y2',
-                            line=dict(width=1),
-                            marker=dict(color='#ccc'), hoverinfo='none',
-                            legendgroup='Bollinger Bands', showlegend=False))
+class DashChart(object):
+    """ Serves the figure of a visible range, min/max-bucketed to at most `max_points` candles.
+
+    The pyramid and indicators are computed once over the whole frame, so each
+    range change only slices and aggregates what is on screen.
+    """
+
+    def __init__(self, df, max_points=2000, key=None, cache_size=64):
+        self.df = df
+        self.max_points = max_points
+        self.x = df.index.values
+        if key is None and len(df):
+            key = (len(df), str(self.x[0]), str(self.x[-1]))
+        self.key = key
+        self.cache_size = cache_size
+        self._payloads = OrderedDict()
+        self.pyramid = BarPyramid(df.Open.values, df.High.values, df.Low.values, df.Close.values, df.Volume.values)
+        self.volume_colors = volume_colors(df.Close.values)
+        # centred as the original np.convolve(close, window, 'same') line, ends clipped:
+        # bar i averages bars i-5..i+4, the trailing SMA four bars later
+        sma = SMA(10, source='Close').batch(df)
+        self.ma = np.full(len(sma), np.nan)
+        self.ma[5:-5] = sma[9:-1]
+        self.bb_avg, self.bb_upper, self.bb_lower = BollingerBands(10, 5, source='Close', ddof=1).batch(df)
+
+    def visible_range(self, relayout_data):
+        """ Bar index range of a relayoutData event, None if the x-axis did not change. """
+        relayout_data = relayout_data or {}
+        if relayout_data.get('xaxis.autorange'):
+            return 0, len(self.x)
+        if 'xaxis.range[0]' in relayout_data:
+            x0, x1 = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+        elif 'xaxis.range' in relayout_data:
+            x0, x1 = relayout_data['xaxis.range']
+        else:
+            return None
+        start = self.x.searchsorted(pd.Timestamp(x0).to_datetime64())
+        stop = self.x.searchsorted(pd.Timestamp(x1).to_datetime64(), side='right')
+        return int(start), int(stop)
+
+    def level(self, start, stop):
+        """ Lowest pyramid level showing bars [start, stop) in at most `max_points` buckets. """
+        start, stop = max(start, 0), min(stop, len(self.x))
+        top = self.pyramid.levels - 1
+        level = 0
+        if stop - start > self.max_points:
+            level = min(int(np.ceil(np.log2((stop - start) / self.max_points))), top)
+        # buckets start at multiples of 2 ** level, so an unaligned range can straddle one more
+        while level < top and ((stop - 1) >> level) - (start >> level) + 1 > self.max_points:
+            level += 1
+        return level
+
+    def figure(self, start=0, stop=None):
+        n = len(self.x)
+        stop = n if stop is None else stop
+        level = self.level(start, stop)
+        _, _, open, high, low, close, volume, _ = self.pyramid.buckets(start, stop, level)
+        first = ((max(start, 0) >> level) + np.arange(len(open))) << level
+        last = np.minimum(first + (1 << level), n) - 1
+        x = self.x[first]
+        if level == 0:
+            colors = self.volume_colors[first]
+        else:
+            colors = volume_colors(close)
+
+        data = [dict(
+            type='candlestick',
+            open=open,
+            high=high,
+            low=low,
+            close=close,
+            x=x,
+            yaxis='y2',
+            name='GS',
+            increasing=dict(line=dict(color=INCREASING_COLOR)),
+            decreasing=dict(line=dict(color=DECREASING_COLOR)),
+        )]
+
+        fig = dict(data=data, layout=_layout())
+        if stop - start < n:
+            fig['layout']['xaxis']['range'] = [pd.Timestamp(self.x[i]).strftime('%Y-%m-%d %H:%M:%S')
+                                               for i in (start, stop - 1)]
+
+        fig['data'].append(dict(x=x, y=self.ma[last], type='scatter', mode='lines',
+                                line=dict(width=1),
+                                marker=dict(color='#E377C2'),
+                                yaxis='y2', name='Moving Average'))
+
+        fig['data'].append(dict(x=x, y=volume,
+                                marker=dict(color=palette(colors, DECREASING_COLOR, INCREASING_COLOR)),
+                                type='bar', yaxis='y', name='Volume'))
+
+        fig['data'].append(dict(x=x, y=self.bb_upper[last], type='scatter', yaxis='y2',
+                                line=dict(width=1),
+                                marker=dict(color='#ccc'), hoverinfo='none',
+                                legendgroup='Bollinger Bands', name='Bollinger Bands'))
+
+        fig['data'].append(dict(x=x, y=self.bb_lower[last], type='scatter', yaxis='y2',
+                                line=dict(width=1),
+                                marker=dict(color='#ccc'), hoverinfo='none',
+                                legendgroup='Bollinger Bands', showlegend=False))
+
+        return fig
+
+    def payload(self, start=0, stop=None):
+        """ encode_figure(self.figure(start, stop)), cached per dataset and range. """
+        stop = len(self.x) if stop is None else stop
+        key = (self.key, self.max_points, start, stop)
+        payload = self._payloads.pop(key, None)
+        if payload is None:
+            fig = self.figure(start, stop)
+            fig['layout']['xaxis']['type'] = 'date'
+            payload = encode_figure(fig)
+            if len(self._payloads) >= self.cache_size:
+                self._payloads.popitem(last=False)
+        self._payloads[key] = payload
+        return payload
+
+
+def generate_graph(df, max_points=2000):
+    return DashChart(df, max_points).figure()
 
-    return fig
 
 if __name__ == '__main__':
+    from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine, MINUTE_DB_NAME
     from vnpy.trader.app.ctaStrategy.strategy.strategyAtrRsi import AtrRsiStrategy
 
     # 创建回测引擎
@@ -148,27 +241,22 @@ if __name__ == '__main__':
     d = {'rsiLength': 4, 'atrLength': 25}
     engine.initStrategy(AtrRsiStrategy, d)
 
-    engine.loadHistoryData()
-
-    # 开始跑回测
-
-    engine.loadHistoryData()
-
+    # 开始跑回测（runBacktesting内部会载入历史数据）
     engine.runBacktesting()
 
     # 显示回测结果
     engine.showBacktestingResult()
 
     # analysis
-    engine.loadHistoryData()
-
     orders = pd.DataFrame([i.__dict__ for i in engine.calculateBacktestingResult()['resultList']])
 
-    df = pd.DataFrame(list(engine.dbCursor)).rename(
+    df = load_bars(MINUTE_DB_NAME, 'rb0000', '20170601', client=engine.dbClient).rename(
         columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}).set_index('datetime')
 
     # df.index = map(lambda x: x.strftime("%Y%m%d %H:%M:%S"), df.datetime)
 
+    chart = DashChart(df)
+
     app = dash.Dash()
 
     app.layout = html.Div(children=[
@@ -178,10 +266,23 @@ if __name__ == '__main__':
             Dash: A web application framework for Python.
         '''),
 
+        dcc.Store(id='figure-data', data=chart.payload()),
+
         dcc.Graph(
-            id='example-graph',
-            figure=generate_graph(df[:1000])
+            id='example-graph'
         )
     ])
 
+    @app.callback(Output('figure-data', 'data'), [Input('example-graph', 'relayoutData')])
+    def update_range(relayout_data):
+        # only the visible range is sent, at screen resolution and as typed arrays
+        visible = chart.visible_range(relayout_data)
+        if visible is None:
+            raise PreventUpdate
+        return chart.payload(*visible)
+
+    # decoded in the browser by assets/aorder.js
+    app.clientside_callback(ClientsideFunction('aorder', 'decode_figure'),
+                            Output('example-graph', 'figure'), [Input('figure-data', 'data')])
+
     app.run_server(debug=True)
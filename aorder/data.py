@@ -0,0 +1,133 @@
+# encoding: UTF-8
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from store import is_store, open_store, write_store
+from ticks import TickSeries, write_tick_store
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.aorder', 'cache')
+
+BAR_DTYPES = [('datetime', 'datetime64[ns]'),
+              ('open', np.float64),
+              ('high', np.float64),
+              ('low', np.float64),
+              ('close', np.float64),
+              ('volume', np.float64),
+              ('openInterest', np.float64)]
+BAR_COLUMNS = [name for name, _ in BAR_DTYPES]
+
+
+def cache_path(db_name, symbol, start_date, end_date=None, cache_dir=CACHE_DIR):
+    # an open-ended range is keyed by today's date so it is re-read once per day
+    end = end_date or 'to' + datetime.now().strftime('%Y%m%d')
+    return os.path.join(cache_dir, '{}_{}_{}_{}.npz'.format(db_name, symbol, start_date, end))
+
+
+def bars_from_records(records):
+    """ Build a typed bar frame from vnpy bar dicts, keeping only BAR_COLUMNS. """
+    df = pd.DataFrame.from_records(records, columns=BAR_COLUMNS)
+    return df.astype(dict(BAR_DTYPES))
+
+
+def query_bars(collection, start_date, end_date=None):
+    flt = {'$gte': datetime.strptime(start_date, '%Y%m%d')}
+    if end_date:
+        flt['$lt'] = datetime.strptime(end_date, '%Y%m%d') + timedelta(days=1)
+    projection = dict((name, True) for name in BAR_COLUMNS)
+    projection['_id'] = False
+    cursor = collection.find({'datetime': flt}, projection).sort('datetime')
+    return bars_from_records(list(cursor))
+
+
+def save_bars(path, df):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    np.savez(path, **dict((name, df[name].values) for name in BAR_COLUMNS))
+
+
+def read_bars(path):
+    with np.load(path) as f:
+        return pd.DataFrame(dict((name, f[name]) for name in BAR_COLUMNS), columns=BAR_COLUMNS)
+
+
+def load_bars(db_name, symbol, start_date, end_date=None, client=None,
+              host='localhost', port=27017, cache_dir=CACHE_DIR, refresh=False):
+    """ Load the bars of `symbol` once and serve later calls from the disk cache.
+
+    Args:
+      db_name: vnpy database name, e.g. MINUTE_DB_NAME
+      symbol: collection name, e.g. 'rb0000'
+      start_date, end_date: 'YYYYMMDD' strings, end_date is inclusive and optional
+      client: a pymongo (or mongomock) client, created from host/port if omitted
+      cache_dir: where the .npz files are kept, None disables caching
+      refresh: ignore an existing cache file
+    """
+    path = cache_path(db_name, symbol, start_date, end_date, cache_dir) if cache_dir else None
+    if path and not refresh and os.path.exists(path):
+        return read_bars(path)
+
+    if client is None:
+        import pymongo
+        client = pymongo.MongoClient(host, port)
+    df = query_bars(client[db_name][symbol], start_date, end_date)
+
+    if path:
+        save_bars(path, df)
+    return df
+
+
+def store_path(db_name, symbol, start_date, end_date=None, cache_dir=CACHE_DIR, **kwargs):
+    """ Path of the bar store of a symbol/date range, writing it from Mongo on first use. """
+    path = os.path.splitext(cache_path(db_name, symbol, start_date, end_date, cache_dir))[0] + '.bars'
+    if kwargs.pop('refresh', False) or not is_store(path):
+        write_store(path, load_bars(db_name, symbol, start_date, end_date, cache_dir=None, **kwargs))
+    return path
+
+
+def load_store(db_name, symbol, start_date, end_date=None, cache_dir=CACHE_DIR, **kwargs):
+    """ Like load_bars, but cache as a memory-mapped bar store and return store.Bars. """
+    return open_store(store_path(db_name, symbol, start_date, end_date, cache_dir, **kwargs))
+
+
+def query_ticks(collection, start_date, end_date=None, chunksize=100000):
+    """ Stream vnpy ticks as (datetime, lastPrice, volume) array chunks. """
+    flt = {'$gte': datetime.strptime(start_date, '%Y%m%d')}
+    if end_date:
+        flt['$lt'] = datetime.strptime(end_date, '%Y%m%d') + timedelta(days=1)
+    projection = {'datetime': True, 'lastPrice': True, 'volume': True, '_id': False}
+    cursor = collection.find({'datetime': flt}, projection).sort('datetime').batch_size(chunksize)
+    records = []
+    for record in cursor:
+        records.append((record['datetime'], record['lastPrice'], record['volume']))
+        if len(records) == chunksize:
+            yield _tick_chunk(records)
+            records = []
+    if records:
+        yield _tick_chunk(records)
+
+
+def _tick_chunk(records):
+    dts, prices, volumes = zip(*records)
+    return np.array(dts, dtype='datetime64[ns]'), np.array(prices, dtype=np.float64), np.array(volumes, dtype=np.int64)
+
+
+def tick_store_path(db_name, symbol, start_date, end_date=None, client=None, host='localhost', port=27017,
+                    cache_dir=CACHE_DIR, refresh=False):
+    """ Path of the tick store of a symbol/date range, streamed from Mongo on first use. """
+    path = os.path.splitext(cache_path(db_name, symbol, start_date, end_date, cache_dir))[0] + '.ticks'
+    if refresh or not is_store(path):
+        if client is None:
+            import pymongo
+            client = pymongo.MongoClient(host, port)
+        write_tick_store(path, query_ticks(client[db_name][symbol], start_date, end_date))
+    return path
+
+
+def load_ticks(db_name, symbol, start_date, end_date=None, base=1, **kwargs):
+    """ ticks.TickSeries of a symbol (e.g. db_name=TICK_DB_NAME), for plot_trade. """
+    return TickSeries(tick_store_path(db_name, symbol, start_date, end_date, **kwargs), base=base)
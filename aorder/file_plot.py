@@ -2,31 +2,28 @@
 
 from __future__ import division
 
-from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine, MINUTE_DB_NAME
+import sys
+
+from vnpy.trader.app.ctaStrategy.ctaBacktesting import MINUTE_DB_NAME
 import pandas as pd
 from utils import plot_trade
+from workspace import plot_workspace
+from data import load_store
+from trades import load_trades
 
-file_name = 'bu_zf.csv'
-
-columns = ['volume', 'entryDate','entryTime', 'entryPrice', 'exitDate','exitTime', 'exitPrice','absPos'
-       ,'pnl', 'commission']
-orders = pd.read_csv(file_name,header=None,names=columns, dtype={'entryDate':str,
-                                                                  'entryTime':str,
-                                                                  'exitDate':str,
-                                                                  'exitTime':str})
-
-orders['entryDt'] = pd.to_datetime(orders['entryDate'] + ' ' + orders['entryTime'])
-orders['exixtDt'] = pd.to_datetime(orders['exitDate'] + ' ' + orders['exitTime'])
-
-engine = BacktestingEngine()
-engine.setBacktestingMode(engine.BAR_MODE)
+# python file_plot.py bu_zf.csv rb_zf.csv ...，多个文件时每个品种一个标签页，时间轴联动
+file_names = sys.argv[1:] or ['bu_zf.csv']
 
-engine.setStartDate(str(orders.entryDate.values[0]))
+orders = dict((file_name.split('_')[0] + '0000', load_trades(file_name)) for file_name in file_names)
 
-engine.setDatabase(MINUTE_DB_NAME,file_name.split('_')[0] + '0000')
 
-engine.loadHistoryData()
+def load_pricing(symbol):
+    start_date = pd.Timestamp(orders[symbol].entryDt.min()).strftime('%Y%m%d')
+    return load_store(MINUTE_DB_NAME, symbol, start_date)
 
-pricing = pd.DataFrame(list(engine.dbCursor))
 
-plot_trade(pricing, volume_bars=True, orders=orders)
\ No newline at end of file
+symbols = list(orders)
+if len(symbols) == 1:
+    plot_trade(load_pricing(symbols[0]), volume_bars=True, orders=orders[symbols[0]])
+else:
+    plot_workspace(symbols, load_pricing, orders=orders)
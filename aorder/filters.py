@@ -0,0 +1,105 @@
+# encoding: UTF-8
+
+import numpy as np
+
+from store import to_epoch_ns
+
+NS_PER_SECOND = 10 ** 9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+MINUTES_PER_DAY = 24 * 60
+
+LONG = 1
+SHORT = -1
+
+
+class ColumnIndex(object):
+    """ A column sorted once; a value range is then two binary searches and a scatter. """
+
+    def __init__(self, values):
+        self.order = np.argsort(values, kind='mergesort')
+        self.sorted = np.asarray(values)[self.order]
+
+    def __len__(self):
+        return len(self.order)
+
+    def mask(self, low=None, high=None):
+        """ Row mask of low <= value <= high; None leaves that side open. """
+        i = 0 if low is None else self.sorted.searchsorted(low, side='left')
+        j = len(self) if high is None else self.sorted.searchsorted(high, side='right')
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.order[i:j]] = True
+        return mask
+
+
+class OrderIndex(object):
+    """ Filter index over an orders table, built once when the orders are set.
+
+    Rows are kept in pnl order, so a pnl percentile range is a contiguous
+    slice. Direction is a precomputed bitmap, holding time and entry time of
+    day are sorted column indexes. Masks are cached by their bounds, so while
+    one control is dragged the others cost only an `&` over the pnl slice.
+    """
+
+    def __init__(self, orders):
+        self.orders = orders = orders.iloc[np.argsort(orders.pnl.values, kind='mergesort')]
+        self.pnl = orders.pnl.values
+        volume = orders.volume.values
+        entry = to_epoch_ns(orders.entryDt.values)
+        self.directions = {LONG: volume > 0, SHORT: volume < 0}
+        self.holding = ColumnIndex((to_epoch_ns(orders.exitDt.values) - entry) // NS_PER_SECOND)
+        self.entry_minute = ColumnIndex((entry // NS_PER_MINUTE) % MINUTES_PER_DAY)
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.pnl)
+
+    def pnl_slice(self, low=0, high=100):
+        """ Row range [i, j) of the pnl percentiles low..high. """
+        n = len(self)
+        return int(np.floor(low / 100.0 * n)), int(np.ceil(high / 100.0 * n))
+
+    def pnl_at(self, percent):
+        """ pnl at a percentile, for labels. """
+        if not len(self):
+            return np.nan
+        return self.pnl[min(int(percent / 100.0 * len(self)), len(self) - 1)]
+
+    def _cached(self, key, make):
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= 64:
+                self._masks.clear()
+            mask = self._masks[key] = make()
+        return mask
+
+    def holding_mask(self, low=None, high=None):
+        return self._cached(('holding', low, high), lambda: self.holding.mask(low, high))
+
+    def entry_time_mask(self, start, end):
+        """ Entries between two minutes of the day; start > end wraps past midnight (night session). """
+        def make():
+            if start <= end:
+                return self.entry_minute.mask(start, end)
+            return self.entry_minute.mask(start, None) | self.entry_minute.mask(None, end)
+        return self._cached(('entry_time', start, end), make)
+
+    def select(self, pnl=(0, 100), direction=0, holding=(None, None), entry_time=None):
+        """ Boolean mask over the rows (pnl order) matching every criterion.
+
+        Args:
+          pnl: (low, high) pnl percentiles
+          direction: LONG, SHORT, or 0 for both
+          holding: (min, max) holding time in seconds, None for an open side
+          entry_time: (start, end) entry minute of the day, or None
+        """
+        i, j = self.pnl_slice(*pnl)
+        window = np.ones(max(j - i, 0), dtype=bool)
+        if direction:
+            window &= self.directions[direction][i:j]
+        if tuple(holding) != (None, None):
+            window &= self.holding_mask(*holding)[i:j]
+        if entry_time is not None:
+            window &= self.entry_time_mask(*entry_time)[i:j]
+        selected = np.zeros(len(self), dtype=bool)
+        selected[i:j] = window
+        return selected
@@ -0,0 +1,369 @@
+# encoding: UTF-8
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+
+def _seeded_ewm(x, n, alpha):
+    """ talib-style smoothing: NaN until n valid inputs, seeded with their mean. """
+    out = np.full(len(x), np.nan)
+    valid = ~np.isnan(x)
+    if not valid.any():
+        return out
+    start = int(np.argmax(valid))
+    seed = start + n - 1
+    if seed >= len(x):
+        return out
+    y = np.concatenate(([x[start:seed + 1].mean()], x[seed + 1:]))
+    out[seed:] = pd.Series(y).ewm(alpha=alpha, adjust=False).mean().values
+    return out
+
+
+def _smooth_state(x, out, n):
+    # (valid inputs seen, capped at n; their sum while warming up; last output)
+    count = int((~np.isnan(x)).sum())
+    if count >= n:
+        return n, 0.0, out[-1]
+    return count, float(np.nansum(x)), np.nan
+
+
+def _smooth_step(state, v, n, alpha):
+    count, total, prev = state
+    if np.isnan(v):
+        return state, prev
+    if count < n:
+        count += 1
+        total += v
+        if count == n:
+            prev = total / n
+        return (count, total, prev), prev
+    prev = prev + alpha * (v - prev)
+    return (count, total, prev), prev
+
+
+def _column(source, bars):
+    if isinstance(source, Indicator):
+        return source.line()
+    return np.asarray(getattr(bars, source), dtype=np.float64)
+
+
+def _last(source, bars):
+    if isinstance(source, Indicator):
+        return source.line()[-1]
+    return float(np.asarray(getattr(bars, source))[-1])
+
+
+class Indicator(object):
+    """ Technical indicator with O(1) per-bar rolling state.
+
+    batch() computes the whole history with vectorized numpy/pandas and primes
+    the rolling state; update() then continues one bar at a time, e.g. for bars
+    appended in live mode. `source` is a bar column name or another indicator,
+    which has to be updated first (IndicatorSet takes care of the order).
+    """
+
+    names = ('value',)
+
+    def __init__(self, source='close'):
+        self.sources = [source]
+        self._buffer = np.empty((len(self.names), 0))
+        self._length = 0
+        self._state = None
+        self._prev = None
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def values(self):
+        return self._buffer[:, :self._length]
+
+    def line(self, i=0):
+        return self._buffer[i, :self._length]
+
+    @property
+    def lines(self):
+        return [self.line(i) for i in range(len(self.names))]
+
+    def _input(self, bars):
+        return _column(self.sources[0], bars)
+
+    def _last_input(self, bars):
+        return _last(self.sources[0], bars)
+
+    def _empty_input(self):
+        return np.empty(0)
+
+    def batch(self, bars):
+        x = self._input(bars)
+        # a copy: pandas may hand back read-only arrays, and update() writes in place
+        self._buffer = np.array(self._batch(x), dtype=np.float64).reshape(len(self.names), len(x))
+        self._length = len(x)
+        if len(x):
+            # prime on all but the last input and step that one, so a still-forming
+            # last bar can be rolled back by update(replace=True)
+            self._prev = self._prime(x[:-1], self._buffer[:, :-1])
+            self._state, _ = self._step(self._prev, x[-1])
+        else:
+            self._prev = None
+            self._state = self._prime(x, self._buffer)
+        return self._buffer[0] if len(self.names) == 1 else tuple(self._buffer)
+
+    def update(self, bars, replace=False):
+        """ Feed the last bar of `bars`; replace=True recomputes a still-forming last bar. """
+        if self._state is None:
+            self._state = self._prime(self._empty_input(), self._buffer[:, :0])
+        if replace and self._length:
+            self._restore()
+            self._length -= 1
+        else:
+            self._prev = self._state
+        self._state, value = self._step(self._state, self._last_input(bars))
+        self._append(value)
+        return value
+
+    def _restore(self):
+        self._state = self._prev
+
+    def _append(self, value):
+        k, capacity = self._buffer.shape
+        if self._length == capacity:
+            buffer = np.empty((k, max(1024, 2 * capacity)))
+            buffer[:, :capacity] = self._buffer
+            self._buffer = buffer
+        self._buffer[:, self._length] = value
+        self._length += 1
+
+    def _batch(self, x):
+        raise NotImplementedError
+
+    def _prime(self, x, values):
+        raise NotImplementedError
+
+    def _step(self, state, x):
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+
+    def __init__(self, n, source='close'):
+        self.n = n
+        self._ring = np.full(n, np.nan)
+        self._evicted = np.nan
+        super(SMA, self).__init__(source)
+
+    def _batch(self, x):
+        return pd.Series(x).rolling(self.n).mean().values
+
+    def _prime(self, x, values):
+        # ring of the last n inputs, `pos` points at the oldest; missing slots are NaN
+        tail = x[-self.n:]
+        self._ring = np.full(self.n, np.nan)
+        self._ring[:len(tail)] = tail
+        pos = len(tail) % self.n
+        return pos, float(np.nansum(self._ring)), float(np.nansum(self._ring ** 2)), int(np.isnan(self._ring).sum())
+
+    def _restore(self):
+        self._ring[self._prev[0]] = self._evicted
+        self._state = self._prev
+
+    def _push(self, state, v):
+        pos, total, squares, nans = state
+        old = self._ring[pos]
+        self._evicted = old
+        self._ring[pos] = v
+        for value, sign in ((v, 1), (old, -1)):
+            if np.isnan(value):
+                nans += sign
+            else:
+                total += sign * value
+                squares += sign * value * value
+        pos = (pos + 1) % self.n
+        if pos == 0 and nans == 0:
+            # re-sum once per window to stop floating-point drift
+            total, squares = float(self._ring.sum()), float((self._ring ** 2).sum())
+        return pos, total, squares, nans
+
+    def _step(self, state, v):
+        state = self._push(state, v)
+        return state, (state[1] / self.n if state[3] == 0 else np.nan)
+
+
+class BollingerBands(SMA):
+    names = ('middle', 'upper', 'lower')
+
+    def __init__(self, n, k=2, source='close', ddof=0):
+        self.k = k
+        self.ddof = ddof
+        super(BollingerBands, self).__init__(n, source)
+
+    def _batch(self, x):
+        rolling = pd.Series(x).rolling(self.n)
+        mean = rolling.mean().values
+        std = rolling.std(ddof=self.ddof).values
+        return np.vstack((mean, mean + self.k * std, mean - self.k * std))
+
+    def _step(self, state, v):
+        state = self._push(state, v)
+        _, total, squares, nans = state
+        if nans:
+            return state, (np.nan, np.nan, np.nan)
+        mean = total / self.n
+        std = np.sqrt(max(squares - total * mean, 0.0) / (self.n - self.ddof))
+        return state, (mean, mean + self.k * std, mean - self.k * std)
+
+
+class EMA(Indicator):
+
+    def __init__(self, n, source='close'):
+        self.n = n
+        self.alpha = 2.0 / (n + 1)
+        super(EMA, self).__init__(source)
+
+    def _batch(self, x):
+        return _seeded_ewm(x, self.n, self.alpha)
+
+    def _prime(self, x, values):
+        return _smooth_state(x, values[0], self.n)
+
+    def _step(self, state, v):
+        return _smooth_step(state, v, self.n, self.alpha)
+
+
+class RSI(Indicator):
+
+    def __init__(self, n=14, source='close'):
+        self.n = n
+        super(RSI, self).__init__(source)
+
+    @staticmethod
+    def _rsi(gain, loss):
+        gain = np.asarray(gain, dtype=np.float64)
+        total = gain + loss
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = 100.0 * gain / total
+        return np.where(total == 0, 0.0, rsi)
+
+    def _batch(self, x):
+        change = np.diff(x)
+        gain = _seeded_ewm(np.clip(change, 0, None), self.n, 1.0 / self.n)
+        loss = _seeded_ewm(np.clip(-change, 0, None), self.n, 1.0 / self.n)
+        self._gain, self._loss = gain, loss
+        return np.concatenate(([np.nan], self._rsi(gain, loss)))[:len(x)]
+
+    def _prime(self, x, values):
+        if len(x) < 2:
+            return (x[-1] if len(x) else np.nan), (0, 0.0, np.nan), (0, 0.0, np.nan)
+        change = np.diff(x)
+        return (x[-1],
+                _smooth_state(np.clip(change, 0, None), self._gain[:len(change)], self.n),
+                _smooth_state(np.clip(-change, 0, None), self._loss[:len(change)], self.n))
+
+    def _step(self, state, v):
+        prev_close, gain_state, loss_state = state
+        if np.isnan(prev_close):
+            return (v, gain_state, loss_state), np.nan
+        change = v - prev_close
+        gain_state, gain = _smooth_step(gain_state, max(change, 0.0), self.n, 1.0 / self.n)
+        loss_state, loss = _smooth_step(loss_state, max(-change, 0.0), self.n, 1.0 / self.n)
+        return (v, gain_state, loss_state), float(self._rsi(gain, loss))
+
+
+class ATR(Indicator):
+
+    def __init__(self, n=14):
+        self.n = n
+        super(ATR, self).__init__(None)
+
+    def _input(self, bars):
+        return np.column_stack([_column(name, bars) for name in ('high', 'low', 'close')])
+
+    def _last_input(self, bars):
+        return [_last(name, bars) for name in ('high', 'low', 'close')]
+
+    def _empty_input(self):
+        return np.empty((0, 3))
+
+    @staticmethod
+    def _true_range(high, low, prev_close):
+        return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    def _batch(self, x):
+        high, low, close = x.T
+        tr = self._true_range(high[1:], low[1:], close[:-1])
+        self._tr = tr
+        atr = _seeded_ewm(tr, self.n, 1.0 / self.n)
+        return np.concatenate(([np.nan], atr))[:len(x)]
+
+    def _prime(self, x, values):
+        if len(x) < 2:
+            return (x[-1, 2] if len(x) else np.nan), (0, 0.0, np.nan)
+        return x[-1, 2], _smooth_state(self._tr[:len(x) - 1], values[0, 1:], self.n)
+
+    def _step(self, state, bar):
+        prev_close, smooth = state
+        high, low, close = bar
+        if np.isnan(prev_close):
+            return (close, smooth), np.nan
+        smooth, value = _smooth_step(smooth, float(self._true_range(high, low, prev_close)), self.n, 1.0 / self.n)
+        return (close, smooth), value
+
+
+class Greater(Indicator):
+    """ 1 where source a is above source b, else 0 (NaN compares as 0). """
+
+    def __init__(self, a, b):
+        super(Greater, self).__init__(a)
+        self.sources = [a, b]
+
+    def _input(self, bars):
+        return np.column_stack([_column(source, bars) for source in self.sources])
+
+    def _last_input(self, bars):
+        return [_last(source, bars) for source in self.sources]
+
+    def _empty_input(self):
+        return np.empty((0, 2))
+
+    def _batch(self, x):
+        with np.errstate(invalid='ignore'):
+            return np.greater(x[:, 0], x[:, 1]).astype(np.float64)
+
+    def _prime(self, x, values):
+        return ()
+
+    def _step(self, state, pair):
+        return state, 1.0 if pair[0] > pair[1] else 0.0
+
+
+class IndicatorSet(object):
+    """ Indicators kept in dependency order, so sources are computed first. """
+
+    def __init__(self, indicators=()):
+        self.indicators = []
+        for indicator in indicators:
+            self.add(indicator)
+
+    def add(self, indicator):
+        if any(indicator is i for i in self.indicators):
+            return
+        for source in indicator.sources:
+            if isinstance(source, Indicator):
+                self.add(source)
+        self.indicators.append(indicator)
+
+    def __iter__(self):
+        return iter(self.indicators)
+
+    def __len__(self):
+        return len(self.indicators)
+
+    def batch(self, bars):
+        for indicator in self.indicators:
+            indicator.batch(bars)
+
+    def update(self, bars, replace=False):
+        for indicator in self.indicators:
+            indicator.update(bars, replace)
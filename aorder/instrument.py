@@ -0,0 +1,131 @@
+# encoding: UTF-8
+
+"""
+性能探针：记录回调耗时和计数，可以导出Chrome trace (chrome://tracing, Perfetto)。
+
+默认关闭，关闭时每个回调只多一次属性判断；设置环境变量 AORDER_PROFILE=1 或调用 profiler.enable() 打开。
+"""
+
+import functools
+import json
+import os
+import threading
+from collections import deque
+from timeit import default_timer as timer
+
+
+class Profiler(object):
+    """ Callback timings and counters, kept as a bounded list of trace events. """
+
+    def __init__(self, enabled=False, max_events=200000):
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.stats = {}
+        self.counters = {}
+        self._origin = timer()
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.stats.clear()
+            self.counters.clear()
+
+    def _us(self, t):
+        return int((t - self._origin) * 1e6)
+
+    def record(self, name, start, stop):
+        """ A finished call of `name` between two timer() readings. """
+        duration = stop - start
+        with self._lock:
+            self.events.append({'name': name, 'ph': 'X', 'ts': self._us(start), 'dur': int(duration * 1e6),
+                                'pid': os.getpid(), 'tid': threading.current_thread().ident})
+            count, total, worst, _ = self.stats.get(name, (0, 0.0, 0.0, 0.0))
+            self.stats[name] = (count + 1, total + duration, max(worst, duration), duration)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + n
+            self.events.append({'name': name, 'ph': 'C', 'ts': self._us(timer()), 'pid': os.getpid(),
+                                'args': {name: value}})
+
+    def summary(self):
+        """ {name: (calls, mean ms, max ms, last ms)} """
+        return dict((name, (count, total / count * 1000, worst * 1000, last * 1000))
+                    for name, (count, total, worst, last) in self.stats.items())
+
+    def export_trace(self, path):
+        """ Write the events as Chrome trace JSON. """
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+profiler = Profiler(enabled=os.environ.get('AORDER_PROFILE', '') not in ('', '0'))
+
+
+def profiled(name):
+    """ Decorator timing every call under `name` while the profiler is enabled. """
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            start = timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.record(name, start, timer())
+        return wrapper
+
+    return decorate
+
+
+class FrameOverlay(object):
+    """ Frame time and callback latencies drawn over a chart's view.
+
+    Frame time is the interval between the scene's paint preparations, so it
+    only means something while the chart is being redrawn.
+    """
+
+    def __init__(self, view, interval=500):
+        from pyqtgraph.Qt import QtCore, QtGui
+
+        self.label = QtGui.QLabel(view)
+        self.label.setStyleSheet('background-color: rgba(0, 0, 0, 160); color: white; padding: 4px;')
+        self.label.move(10, 10)
+        self.label.show()
+        self.frames = deque(maxlen=120)
+        self._last_paint = None
+        view.scene().sigPrepareForPaint.connect(self._painting)
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(interval)
+
+    def _painting(self):
+        now = timer()
+        if self._last_paint is not None:
+            self.frames.append(now - self._last_paint)
+        self._last_paint = now
+        profiler.count('frames')
+
+    def refresh(self):
+        lines = []
+        if self.frames:
+            frame = sorted(self.frames)[len(self.frames) // 2]
+            lines.append('frame %.1f ms (%.0f fps)' % (frame * 1000, 1 / frame if frame else 0))
+        for name, (calls, mean, worst, last) in sorted(profiler.summary().items()):
+            lines.append('%s: %.2f ms, mean %.2f, max %.2f, n=%d' % (name, last, mean, worst, calls))
+        for name, value in sorted(profiler.counters.items()):
+            if name != 'frames':
+                lines.append('%s: %d' % (name, value))
+        self.label.setText('\n'.join(lines))
+        self.label.adjustSize()
@@ -0,0 +1,40 @@
+# encoding: UTF-8
+
+import threading
+import time
+
+import pandas as pd
+
+
+def parse_bar_line(line):
+    """ 'datetime,open,high,low,close,volume' -> bar tuple for TradeChart.follow """
+    fields = line.strip().split(',')
+    return (pd.Timestamp(fields[0]),) + tuple(float(f) for f in fields[1:6])
+
+
+def tail_bars(path, feed, poll=0.5, parse=parse_bar_line):
+    """ Follow a bar CSV that another process appends to, putting ('bar', bar) on `feed`.
+
+    Runs in a daemon thread; hand the same queue to plot_trade(..., feed=feed).
+    """
+
+    def run():
+        with open(path) as f:
+            f.seek(0, 2)
+            pending = ''
+            while True:
+                chunk = f.readline()
+                if not chunk:
+                    time.sleep(poll)
+                    continue
+                pending += chunk
+                if not pending.endswith('\n'):
+                    continue
+                line, pending = pending, ''
+                if line.strip():
+                    feed.put(('bar', parse(line)))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
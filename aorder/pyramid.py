@@ -0,0 +1,192 @@
+import numpy as np
+
+from colors import candle_colors
+
+
+def _reduce_pairs(a, op):
+    return op.reduceat(a, np.arange(0, len(a), 2))
+
+
+def grow_buffer(buf, size):
+    """ Return `buf` if it can hold `size` items, else a copy with doubled capacity. """
+    if len(buf) >= size:
+        return buf
+    new = np.empty(max(size, 2 * len(buf), 1024), dtype=buf.dtype)
+    new[:len(buf)] = buf
+    return new
+
+
+class BarPyramid(object):
+    """ Multi-resolution min/max pyramid over a bar series.
+
+    Level k aggregates 2**k consecutive bars: highs and volumes keep the bucket
+    maximum, lows keep the bucket minimum. Bucket open/close are read straight
+    from the raw columns, so only the extremes need extra storage (~2n values).
+    """
+
+    def __init__(self, open, high, low, close, volume, colors=None, levels=None):
+        self.open = np.asarray(open)
+        self.close = np.asarray(close)
+        self.colors = candle_colors(self.open, self.close) if colors is None else colors
+        self._buffers = None
+        if levels is not None:
+            # prebuilt levels, e.g. memory-mapped from a BarStore
+            self.highs, self.lows, self.volumes = levels
+            return
+        self.highs = [np.asarray(high)]
+        self.lows = [np.asarray(low)]
+        self.volumes = [np.asarray(volume)]
+        while len(self.highs[-1]) > 1:
+            self.highs.append(_reduce_pairs(self.highs[-1], np.maximum))
+            self.lows.append(_reduce_pairs(self.lows[-1], np.minimum))
+            self.volumes.append(_reduce_pairs(self.volumes[-1], np.maximum))
+
+    @staticmethod
+    def level_sizes(n):
+        sizes = [n]
+        while sizes[-1] > 1:
+            sizes.append((sizes[-1] + 1) // 2)
+        return sizes
+
+    def __len__(self):
+        return len(self.open)
+
+    def set_tail(self, open, high, low, close, volume):
+        """ Re-aggregate the buckets holding the last bar, O(log n).
+
+        Called with the new base columns after a bar was appended or the last
+        bar changed. Upper levels live in capacity-doubling buffers, which are
+        copied once on the first call (they may be read-only memmaps).
+        """
+        if self._buffers is None:
+            self._buffers = [[None] + [np.array(level) for level in levels[1:]]
+                             for levels in (self.highs, self.lows, self.volumes)]
+            self._colors = np.array(self.colors)
+        n = len(open)
+        self.open, self.close = open, close
+        self._colors = grow_buffer(self._colors, n)
+        self._colors[n - 1] = close[n - 1] >= open[n - 1]
+        self.colors = self._colors[:n]
+
+        sizes = self.level_sizes(n)
+        for levels, buffers, base, op in ((self.highs, self._buffers[0], high, np.max),
+                                          (self.lows, self._buffers[1], low, np.min),
+                                          (self.volumes, self._buffers[2], volume, np.max)):
+            levels[0] = base
+            i = n - 1
+            for k in range(1, len(sizes)):
+                i >>= 1
+                if k == len(levels):
+                    levels.append(None)
+                    buffers.append(np.empty(0, dtype=base.dtype))
+                buffers[k] = grow_buffer(buffers[k], sizes[k])
+                buffers[k][i] = op(levels[k - 1][2 * i:2 * i + 2])
+                levels[k] = buffers[k][:sizes[k]]
+
+    @property
+    def levels(self):
+        return len(self.highs)
+
+    def level_for(self, bars_per_bucket):
+        if bars_per_bucket <= 1:
+            return 0
+        return min(int(np.log2(bars_per_bucket)), self.levels - 1)
+
+    def buckets(self, start, stop, level):
+        """ Aggregate the bars in [start, stop) at the given level.
+
+        Returns x (bucket centre), width, open, high, low, close, volume and
+        the colour index of each bucket.
+        """
+        n = len(self)
+        start = max(int(start), 0)
+        stop = min(int(stop), n)
+        if stop <= start:
+            empty = np.empty(0)
+            return empty, 1, empty, empty, empty, empty, empty, np.empty(0, np.uint8)
+        if level == 0:
+            return (np.arange(start, stop), 1,
+                    self.open[start:stop], self.highs[0][start:stop], self.lows[0][start:stop],
+                    self.close[start:stop], self.volumes[0][start:stop], self.colors[start:stop])
+        b0 = start >> level
+        b1 = ((stop - 1) >> level) + 1
+        first = np.arange(b0, b1) << level
+        last = np.minimum(first + (1 << level), n) - 1
+        open, close = self.open[first], self.close[last]
+        return ((first + last) / 2.0,
+                1 << level,
+                open,
+                self.highs[level][b0:b1],
+                self.lows[level][b0:b1],
+                close,
+                self.volumes[level][b0:b1],
+                candle_colors(open, close))
+
+    def _query(self, levels, start, stop, op):
+        # bottom-up segment tree walk over the pyramid levels, O(log n)
+        start = max(int(start), 0)
+        stop = min(int(stop), len(self))
+        result = None
+        k = 0
+        while start < stop:
+            if start & 1:
+                v = levels[k][start]
+                result = v if result is None else op(result, v)
+                start += 1
+            if stop & 1:
+                stop -= 1
+                v = levels[k][stop]
+                result = v if result is None else op(result, v)
+            start >>= 1
+            stop >>= 1
+            k += 1
+        return result
+
+    def _query_many(self, levels, start, stop, op, identity):
+        # _query for arrays of ranges at once, one vectorized step per level
+        n = len(self)
+        start = np.clip(np.asarray(start, dtype=np.int64), 0, n)
+        stop = np.clip(np.asarray(stop, dtype=np.int64), 0, n)
+        result = np.full(len(start), identity, dtype=np.float64)
+        k = 0
+        while True:
+            active = start < stop
+            if not active.any():
+                return result
+            m = active & (start & 1 == 1)
+            result[m] = op(result[m], levels[k][start[m]])
+            start[m] += 1
+            m = active & (stop & 1 == 1)
+            stop[m] -= 1
+            result[m] = op(result[m], levels[k][stop[m]])
+            start >>= 1
+            stop >>= 1
+            k += 1
+
+    def range_low(self, start, stop):
+        return self._query(self.lows, start, stop, min)
+
+    def range_low_many(self, start, stop):
+        """ range_low over arrays of [start, stop) ranges; empty ranges give inf. """
+        return self._query_many(self.lows, start, stop, np.minimum, np.inf)
+
+    def range_high_many(self, start, stop):
+        return self._query_many(self.highs, start, stop, np.maximum, -np.inf)
+
+    def range_high(self, start, stop):
+        return self._query(self.highs, start, stop, max)
+
+    def range_volume(self, start, stop):
+        return self._query(self.volumes, start, stop, max)
+
+    @property
+    def low_min(self):
+        return self.lows[-1][0]
+
+    @property
+    def high_max(self):
+        return self.highs[-1][0]
+
+    @property
+    def volume_max(self):
+        return self.volumes[-1][0]
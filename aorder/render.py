@@ -0,0 +1,158 @@
+# encoding: UTF-8
+
+"""
+离线渲染：不打开窗口，把k线、成交量、下单和指标图画成PNG或静态HTML，可以多进程批量渲染。
+
+python render.py --bench --symbols 16 --bars 100000 --orders 2000
+"""
+
+from __future__ import division
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h3>{title}</h3>
+<img src="data:image/png;base64,{image}" width="{width}">
+</body>
+</html>
+"""
+
+
+def use_offscreen():
+    """ Select the offscreen Qt platform; has to run before Qt is imported. """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def render_chart(df, orders=None, technicals=None, region=None, width=1600, height=1000):
+    """ Lay out a TradeChart offscreen and return it as a QImage.
+
+    region is a (start, stop) bar range for the main chart, default all bars.
+    """
+    use_offscreen()
+    import pyqtgraph as pg
+    from pyqtgraph.Qt import QtCore
+    from pyqtgraph.exporters import ImageExporter
+    from utils import TradeChart
+
+    app = pg.mkQApp()
+    chart = TradeChart(df, orders=orders, technicals=technicals)
+    try:
+        chart.main_window.resize(width, height)
+        chart.show()
+        chart.region.setRegion(region or (0, len(chart.bars)))
+        app.processEvents()
+
+        exporter = ImageExporter(chart.win.scene())
+        exporter.parameters()['width'] = width
+        return exporter.export(toBytes=True)
+    finally:
+        # long-running workers render many charts, do not let their Qt objects pile up
+        chart.close()
+        # outside a running event loop deleteLater only happens when asked for
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+
+
+def png_bytes(image):
+    from pyqtgraph.Qt import QtCore
+
+    data = QtCore.QByteArray()
+    buf = QtCore.QBuffer(data)
+    buf.open(QtCore.QIODevice.WriteOnly)
+    image.save(buf, 'PNG')
+    buf.close()
+    return bytes(data)
+
+
+def render_png(path, df, orders=None, technicals=None, region=None, width=1600, height=1000):
+    """ Render the plot_trade layout to a PNG file. """
+    image = render_chart(df, orders, technicals, region, width, height)
+    with open(path, 'wb') as f:
+        f.write(png_bytes(image))
+    return path
+
+
+def render_html(path, df, orders=None, technicals=None, region=None, width=1600, height=1000, title=''):
+    """ Render the plot_trade layout to a standalone HTML page with the PNG embedded. """
+    image = render_chart(df, orders, technicals, region, width, height)
+    with open(path, 'w') as f:
+        f.write(HTML_TEMPLATE.format(title=title, width=width,
+                                     image=base64.b64encode(png_bytes(image)).decode('ascii')))
+    return path
+
+
+def _render_job(job):
+    """ One chart in a worker process; a str `bars` is a bar store path, opened as a memmap. """
+    job = dict(job)
+    bars = job.pop('bars')
+    if isinstance(bars, str):
+        from store import open_store
+        bars = open_store(bars)
+    path = job.pop('path')
+    start = time.time()
+    if path.endswith('.html'):
+        render_html(path, bars, **job)
+    else:
+        render_png(path, bars, **job)
+    return path, time.time() - start
+
+
+def render_many(jobs, processes=None):
+    """ Render many charts in parallel worker processes.
+
+    Each job is a dict of render_png / render_html arguments with the output
+    `path` (.png or .html) and `bars`, a bar DataFrame or a bar store path.
+    Every worker has its own offscreen QApplication, so call this from a
+    process that has not created one itself. Returns (path, seconds) per job.
+    """
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(_render_job, jobs))
+
+
+def benchmark(symbols=8, bars=100000, orders=1000, processes=None, out_dir=None):
+    """ Render `symbols` synthetic charts in parallel; returns charts per second. """
+    from store import write_store
+    from synthetic import synthetic_bars, synthetic_orders
+
+    out_dir = out_dir or tempfile.mkdtemp(prefix='aorder-render-')
+    jobs = []
+    for i in range(symbols):
+        df = synthetic_bars(bars, seed=i)
+        store = write_store(os.path.join(out_dir, 'sym%d.bars' % i), df)
+        jobs.append({'path': os.path.join(out_dir, 'sym%d.png' % i), 'bars': store,
+                     'orders': synthetic_orders(df, orders, seed=i)})
+
+    start = time.time()
+    results = render_many(jobs, processes)
+    elapsed = time.time() - start
+    per_chart = sorted(seconds for _, seconds in results)
+    print('{} charts of {} bars in {:.2f}s: {:.2f} charts/s, median {:.3f}s per chart'.format(
+        symbols, bars, elapsed, symbols / elapsed, per_chart[len(per_chart) // 2]))
+    return symbols / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='aorder headless rendering')
+    parser.add_argument('--bench', action='store_true', help='render synthetic charts and report throughput')
+    parser.add_argument('--symbols', type=int, default=8)
+    parser.add_argument('--bars', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--out', help='output directory, default a temporary one')
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.symbols, args.bars, args.orders, args.processes, args.out)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# encoding: UTF-8
+
+"""
+会话快照：把准备好的k线、金字塔、对齐后的下单和指标存成一个文件，不需要vnpy和Mongo就能直接打开。
+
+python snapshot.py rb0000.aosnap
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from indicators import Indicator, IndicatorSet
+from pyramid import BarPyramid
+from store import PYRAMID_COLUMNS, STORE_DTYPES, Bars, as_bars
+
+MAGIC = b'AORDSNAP'
+VERSION = 1
+ALIGN = 64
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _pack_frame(df):
+    # columns as raw bytes one after another; datetimes as int64 ns, anything else non-numeric as JSON strings
+    columns, chunks, offset = [], [], 0
+    for name in df.columns:
+        values = df[name].values
+        if values.dtype.kind == 'M':
+            dtype, data = 'datetime64[ns]', values.astype('datetime64[ns]').view(np.int64).tobytes()
+        elif values.dtype.kind in 'biuf':
+            dtype, data = values.dtype.str, np.ascontiguousarray(values).tobytes()
+        else:
+            dtype, data = 'json', json.dumps([None if v is None else str(v) for v in values]).encode('utf-8')
+        columns.append({'name': str(name), 'dtype': dtype, 'offset': offset, 'size': len(data)})
+        chunks.append(data)
+        offset += len(data)
+    return columns, b''.join(chunks)
+
+
+def _unpack_frame(columns, data):
+    frame = OrderedDict()
+    for column in columns:
+        raw = data[column['offset']:column['offset'] + column['size']]
+        if column['dtype'] == 'json':
+            frame[column['name']] = json.loads(raw.decode('utf-8'))
+        elif column['dtype'] == 'datetime64[ns]':
+            frame[column['name']] = np.frombuffer(raw, dtype=np.int64).view('datetime64[ns]').copy()
+        else:
+            frame[column['name']] = np.frombuffer(raw, dtype=column['dtype']).copy()
+    return pd.DataFrame(frame, columns=[column['name'] for column in columns])
+
+
+def save_snapshot(path, bars, orders=None, technicals=None, level=6):
+    """ Save a prepared chart session as one file.
+
+    Layout: MAGIC, the header length (uint64 little endian), a JSON header,
+    then every array raw at a 64-byte aligned offset so it can be memory
+    mapped in place: the bar columns, the pyramid levels and one array per
+    technicals line. Indicators are saved as their computed lines. The
+    orders table (e.g. aligned by align.align_orders) is a zlib compressed
+    block at the end.
+    """
+    bars = as_bars(bars)
+    pyramid = bars.pyramid
+    technicals = technicals or []
+    indicators = IndicatorSet(t for _, _, tech in technicals for t in tech if isinstance(t, Indicator))
+    if any(len(indicator) != len(bars) for indicator in indicators):
+        indicators.batch(bars)
+
+    blocks = [('bars/' + name, np.ascontiguousarray(getattr(bars, name), dtype=dtype)) for name, dtype in STORE_DTYPES]
+    blocks.append(('bars/colors', np.ascontiguousarray(pyramid.colors, dtype=np.uint8)))
+    for name, levels in zip(PYRAMID_COLUMNS, (pyramid.highs, pyramid.lows, pyramid.volumes)):
+        dtype = dict(STORE_DTYPES)[name]
+        upper = np.concatenate(levels[1:]) if len(levels) > 1 else np.empty(0)
+        blocks.append(('pyramid/' + name, upper.astype(dtype)))
+
+    tech_meta = []
+    for name, type, tech in technicals:
+        lines = []
+        for t in tech:
+            for values in (t.lines if isinstance(t, Indicator) else [t]):
+                # plain arrays of another bar series (see TradeChart.set_bars) are not shown, nor saved
+                if len(values) != len(bars):
+                    continue
+                key = 'technicals/%d' % len(blocks)
+                blocks.append((key, np.ascontiguousarray(values, dtype=np.float64)))
+                lines.append(key)
+        tech_meta.append({'name': name, 'type': type, 'lines': lines})
+
+    arrays, offset = {}, 0
+    for key, values in blocks:
+        arrays[key] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+        offset = _align(offset + values.nbytes)
+
+    orders_meta, compressed = None, b''
+    if orders is not None:
+        columns, data = _pack_frame(orders)
+        compressed = zlib.compress(data, level)
+        orders_meta = {'columns': columns, 'offset': offset, 'size': len(compressed)}
+
+    header = json.dumps({'version': VERSION, 'length': len(bars), 'arrays': arrays,
+                         'technicals': tech_meta, 'orders': orders_meta}).encode('utf-8')
+    start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for key, values in blocks:
+            f.seek(start + arrays[key]['offset'])
+            values.tofile(f)
+        if orders_meta is not None:
+            f.seek(start + orders_meta['offset'])
+            f.write(compressed)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+    return path
+
+
+class Snapshot(object):
+    """ A chart session read back by open_snapshot; plot_trade(snapshot) shows it. """
+
+    def __init__(self, bars, orders=None, technicals=None):
+        self.bars = bars
+        self.orders = orders
+        self.technicals = technicals or []
+
+
+def open_snapshot(path):
+    """ Open a snapshot; arrays are read-only views of one memory map, only the orders are read. """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('not an aorder snapshot: {}'.format(path))
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size).decode('utf-8'))
+        if header['version'] > VERSION:
+            raise ValueError('snapshot version {} is newer than supported ({})'.format(header['version'], VERSION))
+        start = _align(len(MAGIC) + 8 + size)
+        orders = None
+        if header['orders'] is not None:
+            f.seek(start + header['orders']['offset'])
+            orders = _unpack_frame(header['orders']['columns'], zlib.decompress(f.read(header['orders']['size'])))
+
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+
+    def array(key):
+        spec = header['arrays'][key]
+        dtype = np.dtype(spec['dtype'])
+        offset = start + spec['offset']
+        count = int(np.prod(spec['shape']))
+        return buf[offset:offset + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+    length = header['length']
+    columns = dict((name, array('bars/' + name)) for name, _ in STORE_DTYPES)
+    sizes = BarPyramid.level_sizes(length)
+    offsets = np.cumsum([0] + sizes[1:])
+    levels = []
+    for name in PYRAMID_COLUMNS:
+        upper = array('pyramid/' + name)
+        levels.append([columns[name]] + [upper[offsets[i]:offsets[i + 1]] for i in range(len(sizes) - 1)])
+    pyramid = BarPyramid(columns['open'], columns['high'], columns['low'], columns['close'], columns['volume'],
+                         colors=array('bars/colors'), levels=levels)
+
+    technicals = [(t['name'], t['type'], [array(key) for key in t['lines']]) for t in header['technicals']]
+    return Snapshot(Bars(pyramid=pyramid, **columns), orders, technicals)
+
+
+if __name__ == '__main__':
+    from utils import plot_trade
+
+    plot_trade(open_snapshot(sys.argv[1]))
@@ -0,0 +1,162 @@
+# encoding: UTF-8
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from pyramid import BarPyramid, grow_buffer
+
+STORE_DTYPES = [('datetime', np.int64),
+                ('open', np.float32),
+                ('high', np.float32),
+                ('low', np.float32),
+                ('close', np.float32),
+                ('volume', np.int64)]
+PYRAMID_COLUMNS = ['high', 'low', 'volume']
+
+
+def to_epoch_ns(values):
+    return np.asarray(values, dtype='datetime64[ns]').view(np.int64)
+
+
+class Bars(object):
+    """ Fixed-width bar columns, datetime as int64 epoch nanoseconds.
+
+    Columns may be plain arrays or np.memmap views of a bar store.
+    """
+
+    def __init__(self, datetime, open, high, low, close, volume, pyramid=None):
+        self.datetime = datetime
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self._pyramid = pyramid
+        self._buffers = None
+
+    @classmethod
+    def from_frame(cls, df):
+        columns = [np.asarray(df[name].values, dtype=dtype) for name, dtype in STORE_DTYPES[1:]]
+        return cls(to_epoch_ns(df.datetime.values), *columns)
+
+    @classmethod
+    def empty(cls):
+        return cls(*[np.empty(0, dtype=dtype) for _, dtype in STORE_DTYPES])
+
+    def __len__(self):
+        return len(self.datetime)
+
+    def tail(self, n):
+        """ The last n bars, as views of these columns. """
+        start = max(len(self) - n, 0)
+        return Bars(*[getattr(self, name)[start:] for name, _ in STORE_DTYPES])
+
+    def append(self, datetime, open, high, low, close, volume):
+        """ Append one bar (datetime in epoch ns), growing the columns in place. """
+        self._make_writable()
+        n = len(self) + 1
+        for (name, _), value in zip(STORE_DTYPES, (datetime, open, high, low, close, volume)):
+            buf = self._buffers[name] = grow_buffer(self._buffers[name], n)
+            buf[n - 1] = value
+            setattr(self, name, buf[:n])
+        self._tail_changed()
+
+    def update_last(self, high, low, close, volume):
+        """ Overwrite the still-forming last bar. """
+        self._make_writable()
+        n = len(self)
+        for name, value in (('high', high), ('low', low), ('close', close), ('volume', volume)):
+            self._buffers[name][n - 1] = value
+        self._tail_changed()
+
+    def _make_writable(self):
+        # copy once, the columns may be read-only memmaps
+        if self._buffers is None:
+            self._buffers = dict((name, np.array(getattr(self, name), dtype=dtype)) for name, dtype in STORE_DTYPES)
+            for name, _ in STORE_DTYPES:
+                setattr(self, name, self._buffers[name])
+
+    def _tail_changed(self):
+        if self._pyramid is not None:
+            self._pyramid.set_tail(self.open, self.high, self.low, self.close, self.volume)
+
+    @property
+    def pyramid(self):
+        if self._pyramid is None:
+            self._pyramid = BarPyramid(self.open, self.high, self.low, self.close, self.volume)
+        return self._pyramid
+
+
+def as_bars(data):
+    return data if isinstance(data, Bars) else Bars.from_frame(data)
+
+
+def write_store(path, data):
+    """ Write bars as one raw binary file per column, plus the pyramid levels.
+
+    meta.json is written last, so a store without it is incomplete.
+    """
+    bars = as_bars(data)
+    pyramid = bars.pyramid
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    digest = hashlib.sha1()
+    for name, dtype in STORE_DTYPES:
+        column = np.ascontiguousarray(getattr(bars, name), dtype=dtype)
+        column.tofile(os.path.join(tmp, name + '.bin'))
+        digest.update(column.data)
+    np.asarray(pyramid.colors, dtype=np.uint8).tofile(os.path.join(tmp, 'colors.bin'))
+    for name, levels in zip(PYRAMID_COLUMNS, (pyramid.highs, pyramid.lows, pyramid.volumes)):
+        dtype = dict(STORE_DTYPES)[name]
+        upper = np.concatenate(levels[1:]) if len(levels) > 1 else np.empty(0)
+        upper.astype(dtype).tofile(os.path.join(tmp, name + '.pyr'))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'length': len(bars), 'version': 1, 'digest': digest.hexdigest()}, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp, path)
+    return path
+
+
+def is_store(path):
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def store_digest(path):
+    """ sha1 of the bar columns, computed once when the store was written. """
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)['digest']
+
+
+def _memmap(path, filename, dtype, length):
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(os.path.join(path, filename), dtype=dtype, mode='r', shape=(length,))
+
+
+def open_store(path):
+    """ Open a bar store read-only; no column data is read until it is used. """
+    with open(os.path.join(path, 'meta.json')) as f:
+        length = json.load(f)['length']
+
+    columns = dict((name, _memmap(path, name + '.bin', dtype, length)) for name, dtype in STORE_DTYPES)
+
+    sizes = BarPyramid.level_sizes(length)
+    offsets = np.cumsum([0] + sizes[1:])
+    levels = []
+    for name in PYRAMID_COLUMNS:
+        upper = _memmap(path, name + '.pyr', dict(STORE_DTYPES)[name], offsets[-1])
+        levels.append([columns[name]] + [upper[offsets[i]:offsets[i + 1]] for i in range(len(sizes) - 1)])
+    colors = _memmap(path, 'colors.bin', np.uint8, length)
+
+    pyramid = BarPyramid(columns['open'], columns['high'], columns['low'], columns['close'], columns['volume'],
+                         colors=colors, levels=levels)
+    return Bars(pyramid=pyramid, **columns)
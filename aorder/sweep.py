@@ -0,0 +1,219 @@
+# encoding: UTF-8
+
+"""
+参数优化：在多进程中对策略参数做网格或随机搜索，结果按(策略, 参数, 数据)缓存。
+
+python sweep.py vnpy.trader.app.ctaStrategy.strategy.strategyAtrRsi:AtrRsiStrategy \
+    --symbol rb0000 --start 20160601 -p rsiLength=4,10 -p atrLength=10,25 -p rsiEntry=16,27 --plot
+"""
+
+from __future__ import division
+
+import argparse
+import hashlib
+import importlib
+import itertools
+import json
+import numbers
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from store import open_store, store_digest, to_epoch_ns
+
+SWEEP_DIR = os.path.join(os.path.expanduser('~'), '.aorder', 'sweeps')
+
+
+def grid(space):
+    """ Every combination of a {name: [values]} space. """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_search(space, n, seed=None):
+    """ n distinct random combinations of a {name: [values]} space. """
+    combinations = grid(space)
+    return random.Random(seed).sample(combinations, min(n, len(combinations)))
+
+
+def class_path(cls):
+    return cls if isinstance(cls, str) else '{}:{}'.format(cls.__module__, cls.__name__)
+
+
+def load_class(path):
+    module, name = path.split(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def run_key(strategy, params, setting, digest):
+    text = json.dumps([class_path(strategy), params, setting, digest], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def bar_records(bars, start, stop, symbol='', chunksize=10000):
+    """ vnpy VtBarData dicts for bars[start:stop], read from the (memory-mapped) columns. """
+    for i in range(start, stop, chunksize):
+        j = min(i + chunksize, stop)
+        datetimes = bars.datetime[i:j].view('datetime64[ns]').astype('datetime64[us]').tolist()
+        # float32 store prices back to their decimal values
+        prices = [np.round(np.asarray(column[i:j], dtype=np.float64), 4).tolist()
+                  for column in (bars.open, bars.high, bars.low, bars.close)]
+        volumes = bars.volume[i:j].tolist()
+        for dt, open, high, low, close, volume in zip(datetimes, prices[0], prices[1], prices[2], prices[3], volumes):
+            yield {'vtSymbol': symbol, 'symbol': symbol, 'exchange': '', 'gatewayName': '', 'rawData': None,
+                   'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume, 'openInterest': 0,
+                   'datetime': dt, 'date': dt.strftime('%Y%m%d'), 'time': dt.strftime('%H:%M:%S')}
+
+
+def history_range(bars, data_start, strategy_start, data_end=None):
+    """ Bar indexes (start, split, stop): warm-up bars are [start, split), backtest bars [split, stop).
+
+    Same bounds as vnpy's loadHistoryData, data_end is inclusive.
+    """
+    start, split = bars.datetime.searchsorted(to_epoch_ns([data_start, strategy_start]))
+    stop = len(bars)
+    if data_end:
+        stop = bars.datetime.searchsorted(to_epoch_ns(data_end), side='right')
+    return int(start), int(split), int(stop)
+
+
+def store_engine(path):
+    """ A vnpy BacktestingEngine that reads its history from a bar store instead of Mongo. """
+    from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine
+    from vnpy.trader.vtObject import VtBarData
+
+    class StoreBacktestingEngine(BacktestingEngine):
+        def loadHistoryData(self):
+            bars = open_store(path)
+            start, split, stop = history_range(bars, self.dataStartDate, self.strategyStartDate, self.dataEndDate)
+            # the warm-up bars loadBar hands to strategy.onInit
+            self.initData = []
+            for record in bar_records(bars, start, split, self.symbol):
+                data = VtBarData()
+                data.__dict__ = record
+                self.initData.append(data)
+            self.dbCursor = bar_records(bars, split, stop, self.symbol)
+
+    return StoreBacktestingEngine()
+
+
+def run_backtest(engine_factory, store, strategy, params, setting):
+    """ One backtest in a worker process; returns the scalar results and the closed trades. """
+    engine = engine_factory(store)
+    engine.setBacktestingMode(engine.BAR_MODE)
+    for name, value in sorted(setting.items()):
+        setter = getattr(engine, 'set' + name[0].upper() + name[1:])
+        if isinstance(value, (list, tuple)):
+            setter(*value)
+        else:
+            setter(value)
+    engine.initStrategy(load_class(strategy), dict(params))
+    engine.runBacktesting()
+    result = engine.calculateBacktestingResult()
+    summary = dict((k, v) for k, v in result.items() if isinstance(v, numbers.Number))
+    orders = [dict(r.__dict__) for r in result.get('resultList', [])]
+    return {'params': params, 'summary': summary, 'orders': orders}
+
+
+def orders_frame(run):
+    return pd.DataFrame(run['orders'])
+
+
+def run_sweep(strategy, params_list, store, setting=None, processes=None, metric='capital',
+              cache_dir=SWEEP_DIR, engine_factory=store_engine):
+    """ Backtest every params dict of `params_list` on the bar store at `store`.
+
+    Workers open the store as a memmap, so the bars are shared read-only
+    through the page cache instead of being loaded per run. Finished runs are
+    memoized on disk by (strategy, params, setting, data digest). Returns the
+    runs sorted by `metric`, best first.
+    """
+    strategy = class_path(strategy)
+    setting = setting or {}
+    digest = store_digest(store)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    runs, pending = [], []
+    for params in params_list:
+        key = run_key(strategy, params, setting, digest)
+        path = os.path.join(cache_dir, key + '.pkl') if cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                runs.append(pickle.load(f))
+        else:
+            pending.append((path, params))
+
+    if pending:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [(path, pool.submit(run_backtest, engine_factory, store, strategy, params, setting))
+                       for path, params in pending]
+            for path, future in futures:
+                run = future.result()
+                if path:
+                    with open(path, 'wb') as f:
+                        pickle.dump(run, f, protocol=2)
+                runs.append(run)
+
+    runs.sort(key=lambda run: run['summary'].get(metric, float('-inf')), reverse=True)
+    return runs
+
+
+def _parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='aorder parameter sweep')
+    parser.add_argument('strategy', help='module:Class of the vnpy strategy')
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--start', required=True, help='YYYYMMDD')
+    parser.add_argument('--end', help='YYYYMMDD')
+    parser.add_argument('-p', '--param', action='append', default=[], help='name=v1,v2,...')
+    parser.add_argument('--random', type=int, help='sample this many combinations instead of the full grid')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--metric', default='capital')
+    parser.add_argument('--slippage', type=float, default=0.2)
+    parser.add_argument('--rate', type=float, default=0.3 / 10000)
+    parser.add_argument('--size', type=float, default=300)
+    parser.add_argument('--price-tick', type=float, default=0.2)
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--plot', action='store_true', help='open the best run in plot_trade')
+    args = parser.parse_args()
+
+    from vnpy.trader.app.ctaStrategy.ctaBacktesting import MINUTE_DB_NAME
+    from data import store_path
+
+    space = {}
+    for item in args.param:
+        name, values = item.split('=')
+        space[name] = [_parse_value(v) for v in values.split(',')]
+    params_list = random_search(space, args.random, args.seed) if args.random else grid(space)
+
+    store = store_path(MINUTE_DB_NAME, args.symbol, args.start, args.end)
+    setting = {'startDate': args.start, 'slippage': args.slippage, 'rate': args.rate, 'size': args.size,
+               'priceTick': args.price_tick, 'database': (MINUTE_DB_NAME, args.symbol)}
+    if args.end:
+        setting['endDate'] = args.end
+    runs = run_sweep(args.strategy, params_list, store, setting, args.processes, args.metric)
+
+    for run in runs[:args.top]:
+        print('{} {}'.format(run['params'], run['summary'].get(args.metric)))
+
+    if args.plot and runs:
+        from utils import plot_trade
+        plot_trade(open_store(store), orders=orders_frame(runs[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# encoding: UTF-8
+
+"""
+合成行情和成交，用于离线渲染和性能测试，不需要Mongo和vnpy。
+"""
+
+import numpy as np
+import pandas as pd
+
+from trades import ORDER_COLUMNS, TRADE_COLUMNS
+
+
+def synthetic_bars(n, start='2016-06-01 09:00', freq='1min', price=3000.0, tick=1.0, seed=None):
+    """ n OHLCV bars of a random walk, as the bar DataFrame plot_trade takes. """
+    rng = np.random.RandomState(seed)
+    close = price + tick * np.round(np.cumsum(rng.standard_normal(n) * 2))
+    open = np.concatenate(([price], close[:-1]))
+    spread = tick * np.round(np.abs(rng.standard_normal((2, n))) * 2)
+    high = np.maximum(open, close) + spread[0]
+    low = np.minimum(open, close) - spread[1]
+    volume = rng.randint(1, 5000, n).astype(np.int64)
+    return pd.DataFrame({'datetime': pd.date_range(start, periods=n, freq=freq),
+                         'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        columns=['datetime', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def synthetic_orders(bars, n, max_holding=60, size=10, commission=1.0, seed=None):
+    """ n random round trips over a synthetic_bars frame, filled at the close, as an orders table. """
+    rng = np.random.RandomState(seed)
+    length = len(bars)
+    entry = np.sort(rng.randint(0, max(length - 1, 1), n))
+    exit = np.minimum(entry + rng.randint(1, max_holding + 1, n), length - 1)
+    volume = np.where(rng.randint(0, 2, n) == 1, 1, -1)
+    close = bars.close.values
+    datetimes = bars.datetime.values
+    pnl = (close[exit] - close[entry]) * volume * size - 2 * commission
+    return pd.DataFrame({'volume': volume, 'entryDt': datetimes[entry], 'entryPrice': close[entry],
+                         'exitDt': datetimes[exit], 'exitPrice': close[exit], 'pnl': pnl,
+                         'commission': np.full(n, 2 * commission)}, columns=ORDER_COLUMNS)
+
+
+def write_trades_csv(orders, path):
+    """ Write orders in the headerless trade CSV layout trades.load_trades reads. """
+    entry = pd.DatetimeIndex(orders.entryDt.values)
+    exit = pd.DatetimeIndex(orders.exitDt.values)
+    pd.DataFrame({'volume': orders.volume.values,
+                  'entryDate': entry.strftime('%Y%m%d'), 'entryTime': entry.strftime('%H:%M:%S'),
+                  'entryPrice': orders.entryPrice.values,
+                  'exitDate': exit.strftime('%Y%m%d'), 'exitTime': exit.strftime('%H:%M:%S'),
+                  'exitPrice': orders.exitPrice.values,
+                  'absPos': np.abs(orders.volume.values),
+                  'pnl': orders.pnl.values, 'commission': orders.commission.values},
+                 columns=TRADE_COLUMNS).to_csv(path, header=False, index=False)
+    return path
@@ -0,0 +1,182 @@
+# encoding: UTF-8
+
+from __future__ import division
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from store import STORE_DTYPES, Bars, _memmap, to_epoch_ns
+
+TICK_DTYPES = [('datetime', np.int64),
+               ('price', np.float64),
+               ('volume', np.int64)]
+NS_PER_SECOND = 10 ** 9
+INTERVALS = [('1s', 1), ('5s', 5), ('15s', 15), ('30s', 30),
+             ('1min', 60), ('5min', 300), ('15min', 900), ('30min', 1800),
+             ('1h', 3600), ('1d', 86400)]
+
+
+class TickStoreWriter(object):
+    """ Write ticks chunk by chunk as one raw binary file per column, meta.json last.
+
+    vnpy tick volume is the running total of the trading day, it is stored as
+    the volume traded since the previous tick.
+    """
+
+    def __init__(self, path, cumulative_volume=True):
+        self.path = path
+        self.tmp = path + '.tmp'
+        if os.path.exists(self.tmp):
+            shutil.rmtree(self.tmp)
+        os.makedirs(self.tmp)
+        self.cumulative_volume = cumulative_volume
+        self.length = 0
+        self._last_volume = None
+        self._files = dict((name, open(os.path.join(self.tmp, name + '.bin'), 'wb')) for name, _ in TICK_DTYPES)
+
+    def write(self, datetime, price, volume):
+        volume = np.asarray(volume, dtype=np.int64)
+        if not len(volume):
+            return
+        if self.cumulative_volume:
+            prev = volume[0] if self._last_volume is None else self._last_volume
+            self._last_volume = volume[-1]
+            traded = np.diff(np.concatenate(([prev], volume)))
+            # the total drops when a new trading day starts
+            volume = np.where(traded < 0, volume, traded)
+        for (name, dtype), column in zip(TICK_DTYPES, (to_epoch_ns(datetime), price, volume)):
+            np.ascontiguousarray(column, dtype=dtype).tofile(self._files[name])
+        self.length += len(volume)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        with open(os.path.join(self.tmp, 'meta.json'), 'w') as f:
+            json.dump({'length': self.length, 'version': 1, 'kind': 'ticks'}, f)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self.tmp, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self._files.values():
+                f.close()
+            shutil.rmtree(self.tmp)
+
+
+def write_tick_store(path, chunks, cumulative_volume=True):
+    """ Write an iterable of (datetime, price, volume) chunks as a tick store. """
+    with TickStoreWriter(path, cumulative_volume) as writer:
+        for datetime, price, volume in chunks:
+            writer.write(datetime, price, volume)
+    return path
+
+
+def open_tick_store(path):
+    """ The tick columns as read-only memmaps, by name. """
+    with open(os.path.join(path, 'meta.json')) as f:
+        length = json.load(f)['length']
+    return dict((name, _memmap(path, name + '.bin', dtype, length)) for name, dtype in TICK_DTYPES)
+
+
+def _aggregate(datetime, open, high, low, close, volume, interval):
+    """ OHLCV per interval bucket of one sorted chunk; datetime is the bucket start. """
+    key = datetime // interval
+    starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    ends = np.concatenate((starts[1:], [len(key)])) - 1
+    return [key[starts] * interval, open[starts], np.maximum.reduceat(high, starts),
+            np.minimum.reduceat(low, starts), close[ends], np.add.reduceat(volume, starts)]
+
+
+def _merge(first, second):
+    # two partial bars of the same bucket
+    return [first[0], first[1], max(first[2], second[2]), min(first[3], second[3]), second[4], first[5] + second[5]]
+
+
+def iter_resample(chunks, interval):
+    """ Stream sorted (datetime, price, volume) tick chunks into bar column chunks.
+
+    The last bucket of a chunk may continue in the next one, so it is carried
+    over and merged; only one chunk of ticks is in memory at a time.
+    """
+    carry = None
+    for datetime, price, volume in chunks:
+        if not len(datetime):
+            continue
+        columns = _aggregate(datetime, price, price, price, price, volume, interval)
+        if carry is not None:
+            if columns[0][0] == carry[0]:
+                for column, value in zip(columns, _merge(carry, [c[0] for c in columns])):
+                    column[0] = value
+            else:
+                columns = [np.concatenate(([value], column)) for value, column in zip(carry, columns)]
+        carry = [column[-1] for column in columns]
+        if len(columns[0]) > 1:
+            yield [column[:-1] for column in columns]
+    if carry is not None:
+        yield [np.array([value]) for value in carry]
+
+
+def bars_from_columns(chunks):
+    """ Concatenate bar column chunks into store.Bars with the store dtypes. """
+    chunks = list(chunks)
+    columns = [np.concatenate([chunk[i] for chunk in chunks]).astype(dtype) if chunks else np.empty(0, dtype=dtype)
+               for i, (_, dtype) in enumerate(STORE_DTYPES)]
+    return Bars(*columns)
+
+
+def resample_bars(bars, interval):
+    """ Aggregate bars into a coarser interval (epoch ns), which should be a multiple of theirs. """
+    if not len(bars):
+        return bars
+    return bars_from_columns([_aggregate(bars.datetime, bars.open, bars.high, bars.low, bars.close, bars.volume,
+                                         interval)])
+
+
+class TickSeries(object):
+    """ Ticks of a tick store, resampled on demand into bars of any of `intervals`.
+
+    Every interval is streamed from the memory-mapped ticks chunk by chunk, so
+    neither the ticks nor a fine interval nobody asked for sit in memory. An
+    interval is computed once when first requested and cached, so switching
+    back and forth is free. `base` is the finest interval offered.
+    """
+
+    def __init__(self, path, base=1, chunksize=10 ** 6, intervals=INTERVALS):
+        self.ticks = open_tick_store(path)
+        self.base = base
+        self.chunksize = chunksize
+        self.intervals = [(label, seconds) for label, seconds in intervals if seconds % base == 0]
+        self._bars = {}
+
+    def __len__(self):
+        return len(self.ticks['datetime'])
+
+    def chunks(self):
+        datetime, price, volume = (self.ticks[name] for name, _ in TICK_DTYPES)
+        for i in range(0, len(self), self.chunksize):
+            j = i + self.chunksize
+            yield np.asarray(datetime[i:j]), np.asarray(price[i:j]), np.asarray(volume[i:j])
+
+    def resample(self, seconds):
+        """ store.Bars of `seconds` per bar. """
+        bars = self._bars.get(seconds)
+        if bars is None:
+            bars = self._bars[seconds] = bars_from_columns(iter_resample(self.chunks(), seconds * NS_PER_SECOND))
+        return bars
+
+    def interval_for(self, span, max_bars=3000):
+        """ Smallest interval showing a time span (ns) in at most max_bars bars. """
+        for _, seconds in self.intervals:
+            if span / (seconds * NS_PER_SECOND) <= max_bars:
+                return seconds
+        return self.intervals[-1][1]
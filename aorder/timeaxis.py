@@ -0,0 +1,139 @@
+# encoding: UTF-8
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore
+
+from align import GAP_FACTOR, bar_interval, is_gap
+from store import to_epoch_ns
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+
+class TimeIndex(object):
+    """ Bar index <-> epoch-ns time mapping of a chart, with its session gap table.
+
+    Bars are plotted at their index, so trading-session breaks (lunch, night
+    session, weekends) take no room on the x-axis; a gap is where consecutive
+    bars are more than `gap_factor` bar intervals apart, as align.is_gap. The
+    gap table is extended incrementally as bars are appended.
+    """
+
+    def __init__(self, bars, gap_factor=GAP_FACTOR):
+        self.gap_factor = gap_factor
+        self.reset(bars)
+
+    def reset(self, bars):
+        self.bars = bars
+        self._step = 0
+        self._length = 0
+        self._gaps = np.empty(0, dtype=np.int64)
+
+    @property
+    def datetimes(self):
+        return self.bars.datetime
+
+    def __len__(self):
+        return len(self.bars)
+
+    @property
+    def step(self):
+        """ The bar interval in ns, see align.bar_interval. """
+        if not self._step:
+            self._step = bar_interval(self.datetimes)
+        return self._step
+
+    def _extend(self):
+        n = len(self)
+        if n == self._length:
+            return
+        times = self.datetimes
+        start = max(self._length - 1, 0)
+        new = np.flatnonzero(is_gap(np.diff(times[start:n]), self.step, self.gap_factor)) + start + 1
+        self._gaps = np.concatenate((self._gaps, new))
+        self._length = n
+
+    @property
+    def gaps(self):
+        """ Index of the first bar after each session gap. """
+        self._extend()
+        return self._gaps
+
+    def gaps_between(self, x0, x1):
+        gaps = self.gaps
+        return gaps[gaps.searchsorted(x0):gaps.searchsorted(x1)]
+
+    def to_index(self, times, side='left'):
+        """ Bar index of each time (anything np.datetime64 accepts), as np.searchsorted. """
+        return self.datetimes.searchsorted(to_epoch_ns(times), side=side)
+
+    def to_time(self, x):
+        """ Epoch ns at each (fractional) x, extrapolated by the bar interval past the ends. """
+        self._extend()
+        x = np.asarray(x, dtype=np.float64)
+        if not len(self):
+            return np.zeros(x.shape, dtype=np.int64)
+        i = np.clip(np.floor(x).astype(np.int64), 0, len(self) - 1)
+        return self.datetimes[i] + ((x - i) * self.step).astype(np.int64)
+
+    def format(self, x, fmt='%Y-%m-%d %H:%M'):
+        return pd.Timestamp(int(self.to_time(x))).strftime(fmt)
+
+
+class TimeAxisItem(pg.AxisItem):
+    """ Bottom axis printing the bar times of a TimeIndex, in a format fitting the zoom. """
+
+    def __init__(self, index, *args, **kwargs):
+        kwargs.setdefault('orientation', 'bottom')
+        super(TimeAxisItem, self).__init__(*args, **kwargs)
+        self.index = index
+
+    def tickStrings(self, values, scale, spacing):
+        values = np.asarray(values, dtype=np.float64) * scale
+        if not len(values) or not len(self.index):
+            return ['' for _ in values]
+        span = spacing * scale * self.index.step
+        if span >= NS_PER_DAY:
+            fmt = '%Y-%m-%d'
+        elif span >= 60 * NS_PER_MINUTE:
+            fmt = '%m-%d %H:%M'
+        elif span >= NS_PER_MINUTE:
+            fmt = '%H:%M'
+        else:
+            fmt = '%H:%M:%S'
+        labels = pd.to_datetime(self.index.to_time(values)).strftime(fmt)
+        inside = (values >= 0) & (values < len(self.index))
+        return [label if ok else '' for label, ok in zip(labels, inside)]
+
+
+class SessionGapItem(pg.GraphicsObject):
+    """ Dashed lines at the session gaps of the visible range; hidden when there are too many to read. """
+
+    def __init__(self, index, pen=None, max_lines=300):
+        super(SessionGapItem, self).__init__()
+        self.index = index
+        self.pen = pen or pg.mkPen((150, 150, 150), style=QtCore.Qt.DashLine)
+        self.max_lines = max_lines
+
+    def viewRangeChanged(self):
+        self.prepareGeometryChange()
+        self.update()
+
+    def boundingRect(self):
+        rect = self.viewRect()
+        return rect if rect is not None else QtCore.QRectF()
+
+    def paint(self, p, *args):
+        rect = self.viewRect()
+        if rect is None:
+            return
+        gaps = self.index.gaps_between(rect.left(), rect.right())
+        if len(gaps) > self.max_lines:
+            return
+        p.setPen(self.pen)
+        for x in gaps:
+            p.drawLine(QtCore.QPointF(x - 0.5, rect.top()), QtCore.QPointF(x - 0.5, rect.bottom()))
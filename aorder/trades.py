@@ -0,0 +1,59 @@
+# encoding: UTF-8
+
+import numpy as np
+import pandas as pd
+
+TRADE_COLUMNS = ['volume', 'entryDate', 'entryTime', 'entryPrice', 'exitDate', 'exitTime', 'exitPrice', 'absPos',
+                 'pnl', 'commission']
+TRADE_DTYPES = {'volume': np.int32,
+                'entryDate': str,
+                'entryTime': str,
+                'entryPrice': np.float64,
+                'exitDate': str,
+                'exitTime': str,
+                'exitPrice': np.float64,
+                'pnl': np.float64,
+                'commission': np.float64}
+ORDER_COLUMNS = ['volume', 'entryDt', 'entryPrice', 'exitDt', 'exitPrice', 'pnl', 'commission']
+
+
+def parse_datetime(dates, times, date_format='%Y%m%d'):
+    """ Parse separate date and time columns into int64 epoch nanoseconds.
+
+    Dates are parsed with an explicit format and times ('HH:MM:SS[.fff]') as
+    offsets, so no concatenated strings are built.
+    """
+    # pandas may parse at a coarser resolution than ns, so convert explicitly
+    days = pd.to_datetime(dates, format=date_format).values.astype('datetime64[ns]').view(np.int64)
+    offsets = pd.to_timedelta(times).values.astype('timedelta64[ns]').view(np.int64)
+    return days + offsets
+
+
+def compact_orders(chunk, date_format='%Y%m%d'):
+    """ Turn raw trade rows into the orders table CustomPlotItem expects. """
+    orders = pd.DataFrame({
+        'volume': chunk.volume.values,
+        'entryDt': parse_datetime(chunk.entryDate.values, chunk.entryTime.values, date_format).view('datetime64[ns]'),
+        'entryPrice': chunk.entryPrice.values,
+        'exitDt': parse_datetime(chunk.exitDate.values, chunk.exitTime.values, date_format).view('datetime64[ns]'),
+        'exitPrice': chunk.exitPrice.values,
+        'pnl': chunk.pnl.values,
+        'commission': chunk.commission.values,
+    }, columns=ORDER_COLUMNS)
+    return orders
+
+
+def iter_trades(path, chunksize=100000, date_format='%Y%m%d', **kwargs):
+    """ Stream a trade CSV (no header, TRADE_COLUMNS) as compact orders chunks. """
+    reader = pd.read_csv(path, header=None, names=TRADE_COLUMNS, dtype=TRADE_DTYPES,
+                         usecols=[c for c in TRADE_COLUMNS if c != 'absPos'],
+                         chunksize=chunksize, **kwargs)
+    for chunk in reader:
+        yield compact_orders(chunk, date_format)
+
+
+def load_trades(path, chunksize=100000, date_format='%Y%m%d', **kwargs):
+    chunks = list(iter_trades(path, chunksize, date_format, **kwargs))
+    if not chunks:
+        return pd.DataFrame(columns=ORDER_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
@@ -1,9 +1,24 @@
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 import pandas as pd
 import numpy as np
-# import matplotlib.pyplot as plt
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtGui
 
+from align import add_orders, align_orders, is_aligned, remap_orders
+from background import ChartLoader
+from candles import CandleStyle, CandlestickItem, VolumeItem
+from filters import LONG, SHORT, OrderIndex
+from indicators import Indicator, IndicatorSet
+from instrument import FrameOverlay, profiled, profiler
+from snapshot import Snapshot, save_snapshot
+from store import Bars, as_bars, to_epoch_ns
+from ticks import TickSeries
+from timeaxis import SessionGapItem, TimeAxisItem, TimeIndex
+
 
 def plot_candles(pricing, title=None, volume_bars=False, color_function=None, technicals=None):
     """ Plots a candlestick chart using quantopian pricing data.
@@ -15,6 +30,8 @@ def plot_candles(pricing, title=None, volume_bars=False, color_function=None, te
       color_function: A function which, given a row index and price series, returns a candle color.
       technicals: A list of additional data series to add to the chart.  Must be the same length as pricing.
     """
+    # imported here so the Qt charts don't need matplotlib
+    import matplotlib.pyplot as plt
 
     def default_color(index, open_price, close_price, low, high):
         return 'r' if open_price[index] > close_price[index] else 'g'
@@ -82,15 +99,83 @@ class BarGraph(pg.BarGraphItem):
 class CustomPlotItem(pg.PlotItem):
 
     def __init__(self, *args, **kwargs):
-        self.orders = kwargs.pop('orders', None)
-        self.df = kwargs.pop('df', None)
+        orders = kwargs.pop('orders', None)
+        self.time_index = kwargs.pop('time_index', None)
 
         super(CustomPlotItem, self).__init__(*args, **kwargs)
         self._region = None
         self._step = None
-        self.slider = None
-        self.order_plots = []
-        self.sorted_pnl = self.orders.pnl.sort_values().values
+        self.filter = None
+        self.buy_plot = self.plot([], [], pen=None, symbolBrush=(255, 0, 0), symbol='t1')
+        self.sell_plot = self.plot([], [], pen=None, symbolBrush=(0, 255, 0), symbol='t')
+        self.exit_plot = self.plot([], [], pen=None, symbolBrush=(0, 0, 255))
+        self.bad_plot = self.plot([], [], pen=None, symbolBrush=(255, 0, 255), symbol='x', symbolSize=12)
+        for item in (self.buy_plot, self.sell_plot, self.exit_plot, self.bad_plot):
+            # marker arrays are in pnl order, not x order, so they are never clipped or downsampled
+            item.setClipToView(False)
+            item.setDownsampling(1, False)
+        self.set_orders(orders)
+
+    def set_orders(self, orders, index=None):
+        """ Precompute marker positions and the filter index once, in pnl order.
+
+        A filter change is then a boolean mask from the OrderIndex applied to
+        these arrays, see plot_orders. Orders aligned by align.align_orders are
+        placed at their aligned bars, and their bad fills get a marker of their own.
+        """
+        self.orders = orders
+        if orders is None or orders.empty:
+            self.index = None
+            self.sorted_pnl = np.empty(0)
+            self._groups = []
+            self._by_entry = None
+            for item in (self.buy_plot, self.sell_plot, self.exit_plot, self.bad_plot):
+                item.setData([], [])
+            return
+
+        self.index = index if index is not None else OrderIndex(orders)
+        orders = self.index.orders
+        self.sorted_pnl = self.index.pnl
+        if is_aligned(orders):
+            entry_x, exit_x = orders.entryBar.values, orders.exitBar.values
+        else:
+            entry_x = self.time_index.to_index(orders.entryDt.values)
+            exit_x = self.time_index.to_index(orders.exitDt.values)
+        buy = self.index.directions[LONG]
+        sell = self.index.directions[SHORT]
+
+        self._groups = [
+            (self.buy_plot, buy, entry_x[buy], orders.entryPrice.values[buy]),
+            (self.sell_plot, sell, entry_x[sell], orders.entryPrice.values[sell]),
+            (self.exit_plot, None, exit_x, orders.exitPrice.values),
+        ]
+        if is_aligned(orders):
+            bad_entry = orders.entryOutOfRange.values | orders.entryInGap.values | orders.entryPriceOutside.values
+            bad_exit = orders.exitOutOfRange.values | orders.exitInGap.values | orders.exitPriceOutside.values
+            self._groups.append((self.bad_plot,
+                                 np.concatenate((np.flatnonzero(bad_entry), np.flatnonzero(bad_exit))),
+                                 np.concatenate((entry_x[bad_entry], exit_x[bad_exit])),
+                                 np.concatenate((orders.entryPrice.values[bad_entry],
+                                                 orders.exitPrice.values[bad_exit]))))
+
+        # bar -> trade lookup for the crosshair readout
+        by_entry = np.argsort(entry_x, kind='mergesort')
+        self._by_entry = (entry_x[by_entry], exit_x[by_entry], orders.volume.values[by_entry],
+                          orders.entryPrice.values[by_entry], orders.exitPrice.values[by_entry],
+                          self.sorted_pnl[by_entry])
+
+    def order_near(self, index):
+        """ (volume, entryPrice, exitPrice, pnl) of the trade held at bar `index`,
+        else of the trade entered closest to it; None without orders.
+        """
+        if self._by_entry is None:
+            return None
+        entry_x, exit_x = self._by_entry[:2]
+        i = entry_x.searchsorted(index, side='right') - 1
+        if i < 0 or (exit_x[i] < index and i + 1 < len(entry_x)
+                     and entry_x[i + 1] - index < index - exit_x[i]):
+            i += 1
+        return tuple(column[i] for column in self._by_entry[2:])
 
     def keyPressEvent(self, event, *args, **kwargs):
         super(CustomPlotItem, self).keyPressEvent(event, *args, **kwargs)
@@ -106,213 +191,553 @@ class CustomPlotItem(pg.PlotItem):
         self._region = region
         self._step = step
 
-    def update_orders(self, percent=100):
-        ind = int(percent / 100.0 * self.orders.shape[0])
-        if ind == self.orders.shape[0]:
-            ind = ind - 1
-        pnl = self.sorted_pnl[ind]
-        if self.slider:
-            self.slider.label.setText("{}%,{}".format(percent, int(pnl)))
-            if self.slider.check_box.checkState() == QtCore.Qt.Checked:
-                orders = self.orders[self.orders.pnl > pnl]
-            else:
-                orders = self.orders[self.orders.pnl < pnl]
-        else:
-            orders = self.orders[self.orders.pnl < pnl]
-        self.plot_orders(orders)
-
-    def plot_orders(self, orders):
-        if len(self.order_plots) != 0:
-            for pt in self.order_plots:
-                self.removeItem(pt)
-        if orders is not None and not orders.empty:
-            buy_orders = orders[orders.volume==1]
-            sell_orders = orders[orders.volume==-1]
-            buy_orderXs = self.df.datetime.searchsorted(buy_orders.entryDt)
-            sell_orderXs = self.df.datetime.searchsorted(sell_orders.entryDt)
-            buy_orderYs = buy_orders.entryPrice
-            sell_orderYs = sell_orders.entryPrice
-            exitXs = self.df.datetime.searchsorted(orders.exitDt)
-            exitYs = orders.exitPrice
-            try:
-                pt = self.plot(buy_orderXs,
-                        buy_orderYs.values,
-                        pen=None,
-                        symbolBrush=(255, 0, 0),
-                        symbol='t1')
-                self.order_plots.append(pt)
-            except:
-                pass
-            try:
-                pt = self.plot(sell_orderXs,
-                        sell_orderYs.values,
-                        pen=None,
-                        symbolBrush=(0, 255, 0),
-                        symbol='t')
-                self.order_plots.append(pt)
-            except:
-                pass
-            try:
-                pt = self.plot(exitXs,
-                        exitYs.values,
-                        pen=None,
-                        symbolBrush=(0, 0, 255),
-                        )
-                self.order_plots.append(pt)
-            except:
-                pass
-
-class Slider(QtGui.QWidget):
+    @profiled('filter')
+    def update_orders(self, *args):
+        """ Redraw the markers for the criteria of the filter panel (all orders without one). """
+        if self.index is None:
+            return
+        criteria = self.filter.criteria() if self.filter else {}
+        selected = self.plot_orders(**criteria)
+        if self.filter:
+            low, high = criteria['pnl']
+            self.filter.label.setText("{}-{}%,{}~{}\n{}/{}".format(
+                low, high, int(self.index.pnl_at(low)), int(self.index.pnl_at(high)),
+                int(selected.sum()), len(self.index)))
+
+    def plot_orders(self, **criteria):
+        """ Show the orders matching OrderIndex.select(**criteria); returns the selection mask. """
+        selected = self.index.select(**criteria)
+        for item, rows, xs, ys in self._groups:
+            keep = selected if rows is None else selected[rows]
+            item.setData(xs[keep], ys[keep])
+        if profiler.enabled:
+            profiler.count('markers set', int(selected.sum()))
+        return selected
+
+
+class OrderFilter(QtGui.QWidget):
+    """ Order filter controls: pnl percentile range, direction, holding time and entry time of day. """
+
     def __init__(self, parent=None):
-        super(Slider, self).__init__(parent=parent)
+        super(OrderFilter, self).__init__(parent=parent)
 
         self.verticalLayout = QtGui.QVBoxLayout(self)
         self.label = QtGui.QLabel(self)
         self.verticalLayout.addWidget(self.label)
-        self.slider = QtGui.QSlider(self)
-        self.slider.setValue(0)
-        self.verticalLayout.addWidget(self.slider)
-        self.check_box = QtGui.QCheckBox('large than', self)
-        self.verticalLayout.addWidget(self.check_box)
+
+        # pnl percentile range, two handles
+        sliders = QtGui.QHBoxLayout()
+        self.low_slider = QtGui.QSlider(self)
+        self.high_slider = QtGui.QSlider(self)
+        for slider, value in ((self.low_slider, 0), (self.high_slider, 100)):
+            slider.setRange(0, 100)
+            slider.setValue(value)
+            sliders.addWidget(slider)
+        self.verticalLayout.addLayout(sliders, 1)
+        # the handles push each other instead of crossing
+        self.low_slider.valueChanged.connect(lambda v: self.high_slider.setValue(max(v, self.high_slider.value())))
+        self.high_slider.valueChanged.connect(lambda v: self.low_slider.setValue(min(v, self.low_slider.value())))
+
+        self.direction = QtGui.QComboBox(self)
+        self.direction.addItems(['all', 'long', 'short'])
+        self.verticalLayout.addWidget(self.direction)
+
+        # holding time in minutes, 0 leaves that side open
+        self.verticalLayout.addWidget(QtGui.QLabel('holding (min)', self))
+        self.min_holding = QtGui.QSpinBox(self)
+        self.max_holding = QtGui.QSpinBox(self)
+        for box in (self.min_holding, self.max_holding):
+            box.setRange(0, 100000)
+            self.verticalLayout.addWidget(box)
+
+        self.entry_time = QtGui.QCheckBox('entry time', self)
+        self.verticalLayout.addWidget(self.entry_time)
+        self.entry_start = QtGui.QTimeEdit(QtCore.QTime(21, 0), self)
+        self.entry_end = QtGui.QTimeEdit(QtCore.QTime(15, 0), self)
+        for edit in (self.entry_start, self.entry_end):
+            edit.setDisplayFormat('HH:mm')
+            self.verticalLayout.addWidget(edit)
+
+    def connect_changed(self, slot):
+        """ Call slot whenever any criterion changes. """
+        self.low_slider.valueChanged.connect(slot)
+        self.high_slider.valueChanged.connect(slot)
+        self.direction.currentIndexChanged.connect(slot)
+        self.min_holding.valueChanged.connect(slot)
+        self.max_holding.valueChanged.connect(slot)
+        self.entry_time.stateChanged.connect(slot)
+        self.entry_start.timeChanged.connect(slot)
+        self.entry_end.timeChanged.connect(slot)
+
+    def criteria(self):
+        """ The current settings as OrderIndex.select keyword arguments. """
+        min_holding = self.min_holding.value()
+        max_holding = self.max_holding.value()
+        entry_time = None
+        if self.entry_time.checkState() == QtCore.Qt.Checked:
+            start, end = self.entry_start.time(), self.entry_end.time()
+            entry_time = (start.hour() * 60 + start.minute(), end.hour() * 60 + end.minute())
+        return {'pnl': (self.low_slider.value(), self.high_slider.value()),
+                'direction': (0, LONG, SHORT)[self.direction.currentIndex()],
+                'holding': (min_holding * 60 if min_holding else None, max_holding * 60 if max_holding else None),
+                'entry_time': entry_time}
 
 
 class Widget(QtGui.QWidget):
+    closed = QtCore.Signal()
+
     def __init__(self, parent=None):
         super(Widget, self).__init__(parent=parent)
 
         self.horizontalLayout = QtGui.QHBoxLayout(self)
-        self.slider = Slider(self)
+        self.filter = OrderFilter(self)
 
-        self.horizontalLayout.addWidget(self.slider)
+        self.horizontalLayout.addWidget(self.filter)
 
     def addWidget(self, widget):
         self.horizontalLayout.addWidget(widget)
 
+    def closeEvent(self, event):
+        self.closed.emit()
+        super(Widget, self).closeEvent(event)
 
-def plot_trade(df, *args, **kwargs):
-    orders = kwargs.pop('orders', None)
-    technicals = kwargs.pop('technicals', {})
-
-    win = pg.GraphicsWindow()
 
-    label = pg.LabelItem(justify='right')
-    win.addItem(label)
+class IntervalSelector(object):
+    """ Switches a TradeChart between the bar intervals of a ticks.TickSeries.
 
-    p1 = CustomPlotItem(orders=orders, df=df)
-    win.ci.addItem(p1, row=1, col=0)
-    p3 = win.addPlot(row=2, col=0)
-    p2 = win.addPlot(row=3, col=0)
-    row_count = 4
-    p3.setXLink(p1)
-
-    win.ci.layout.setRowStretchFactor(1, 10)
+    'auto' picks the smallest interval that shows the visible time span in at
+    most `max_bars` bars, re-evaluated on every range change.
+    """
 
-    region = pg.LinearRegionItem()
-    region.setZValue(10)
+    def __init__(self, chart, series, interval='auto', max_bars=3000):
+        self.chart = chart
+        self.series = series
+        self.max_bars = max_bars
+        self.seconds = None
+        self._switching = False
+
+        self.combo = QtGui.QComboBox()
+        labels = [label for label, _ in series.intervals]
+        self.combo.addItems(['auto'] + labels)
+        chart.main_window.filter.verticalLayout.insertWidget(0, self.combo)
+        if interval != 'auto':
+            self.combo.setCurrentIndex(labels.index(interval) + 1)
+        self.combo.currentIndexChanged.connect(self.selected)
+        chart.p1.sigXRangeChanged.connect(self.range_changed)
+        self.selected(self.combo.currentIndex())
+
+    def selected(self, index):
+        if index == 0:
+            self.range_changed()
+        else:
+            self.show(self.series.intervals[index - 1][1])
+
+    def range_changed(self, *args):
+        if self._switching or self.combo.currentIndex() != 0:
+            return
+        if not len(self.chart.bars):
+            return
+        start, stop = self.chart.time_index.to_time(self.chart.p1.vb.viewRange()[0])
+        self.show(self.series.interval_for(stop - start, self.max_bars))
+
+    def show(self, seconds):
+        if seconds == self.seconds:
+            return
+        self.seconds = seconds
+        self._switching = True
+        try:
+            self.chart.set_bars(self.series.resample(seconds))
+        finally:
+            self._switching = False
+
+
+class TradeChart(object):
+    """ The plot_trade window: candles, volume, overview region, orders and technicals.
+
+    Bars and orders can be appended after construction (see append_bar,
+    update_last_bar, add_orders and follow), which only touches the tail of
+    the chart.
+    """
 
-    p2.addItem(region, ignoreBounds=True)
+    def __init__(self, df, orders=None, technicals=None, profile=False):
+        self.bars = bars = as_bars(df)
+        technicals = technicals or []
 
-    # pg.dbg()
-    # p1.setAutoVisible(y=True)
+        self.win = win = pg.GraphicsWindow()
 
-    brushes = (df.close - df.open).apply(lambda x: 'r' if x >= 0 else 'g')
+        self.label = pg.LabelItem(justify='right')
+        win.addItem(self.label)
 
-    scale = 1
-    length = len(df.index)
-    x1 = np.arange(length) * scale
-    width1 = scale * 0.8
-    width2 = scale * 0.01
+        # bars are plotted at their index; the time axes, order markers,
+        # crosshair and technicals all map times through this one index
+        self.time_index = TimeIndex(bars)
 
-    bg = pg.BarGraphItem(x=x1, y0=df.open, y1=df.close, width=width1, brushes=brushes)
-    bg1 = pg.BarGraphItem(x=x1, y0=df.low, y1=df.high, width=width2, brushes=brushes)
-    p1.addItem(bg)
-    p1.addItem(bg1)
+        if orders is not None and not orders.empty and not is_aligned(orders):
+            orders = align_orders(bars, orders, step=self.time_index.step, gap_factor=self.time_index.gap_factor)
+        self.p1 = p1 = CustomPlotItem(orders=orders, time_index=self.time_index,
+                                      axisItems={'bottom': TimeAxisItem(self.time_index)})
+        win.ci.addItem(p1, row=1, col=0)
+        self.p3 = p3 = win.addPlot(row=2, col=0, axisItems={'bottom': TimeAxisItem(self.time_index)})
+        self.p2 = p2 = win.addPlot(row=3, col=0, axisItems={'bottom': TimeAxisItem(self.time_index)})
+        self._row_count = 4
+        p3.setXLink(p1)
 
-    main_window = Widget()
-    main_window.addWidget(win)
-    main_window.slider.slider.valueChanged.connect(p1.update_orders)
-    main_window.slider.check_box.stateChanged.connect(p1.update_orders)
-    p1.slider = main_window.slider
+        win.ci.layout.setRowStretchFactor(1, 10)
 
-    p1.update_orders()
+        self.region = region = pg.LinearRegionItem()
+        region.setZValue(10)
 
-    main_low = df.low.min()
-    if len(technicals) != 0:
+        p2.addItem(region, ignoreBounds=True)
+
+        # pg.dbg()
+        # p1.setAutoVisible(y=True)
+
+        self.pyramid = pyramid = bars.pyramid
+
+        length = len(bars)
+
+        style = CandleStyle()
+        self.candles = CandlestickItem(pyramid, style)
+        p1.addItem(self.candles)
+        p1.addItem(SessionGapItem(self.time_index), ignoreBounds=True)
+
+        self.main_window = main_window = Widget()
+        main_window.addWidget(win)
+        main_window.filter.connect_changed(p1.update_orders)
+        p1.filter = main_window.filter
+
+        p1.update_orders()
+
+        self.technicals = []
+        self.indicators = IndicatorSet()
+        self._indicator_curves = []
+        self._static_curves = []
+        self._curves_pending = False
+        self.add_technicals(technicals)
+
+        self.volume = VolumeItem(pyramid, style)
+        p3.addItem(self.volume)
+        self.overview = CandlestickItem(pyramid, style)
+        p2.addItem(self.overview)
+
+        region.sigRegionChanged.connect(lambda region: self.update())
+        p1.sigRangeChanged.connect(self.update_region)
+
+        region.setRegion([0.1 * length, 0.2 * length])
+        p1.set_region(region, 10)
+
+        # cross hair
+        self.vLine = pg.InfiniteLine(angle=90, movable=False)
+        self.hLine = pg.InfiniteLine(angle=0, movable=False)
+        p1.addItem(self.vLine, ignoreBounds=True)
+        p1.addItem(self.hLine, ignoreBounds=True)
+
+        self._labels = {}
+        self.proxy = pg.SignalProxy(p1.scene().sigMouseMoved, rateLimit=60, slot=self.mouse_moved)
+        self._timer = None
+
+        self.overlay = None
+        # False while a background loader is still filling the chart, see load
+        self.loaded = True
+        if profile:
+            profiler.enable()
+            self.overlay = FrameOverlay(win)
+
+    def add_technicals(self, technicals, batched=False):
+        """ Plot (name, type, [tech]) tuples, see plot_trade.
+
+        technicals may mix plain arrays with Indicator objects; indicators are
+        computed here unless `batched` says they already were over these bars,
+        and are kept up to date when bars are appended.
+        """
+        indicators = IndicatorSet(t for _, _, tech in technicals for t in tech if isinstance(t, Indicator))
+        if not batched:
+            indicators.batch(self.bars)
+        for indicator in indicators:
+            self.indicators.add(indicator)
+        self.technicals.extend(technicals)
+
+        x = np.arange(len(self.bars))
         for name, type, tech in technicals:
             if type == 1:
-                tmp = win.addPlot(title=name, row=row_count, col=0)
-                row_count = row_count + 1
-                tmp.setXLink(p1)
+                tmp = self.win.addPlot(title=name, row=self._row_count, col=0,
+                                       axisItems={'bottom': TimeAxisItem(self.time_index)})
+                self._row_count += 1
+                tmp.setXLink(self.p1)
                 tmp.enableAutoRange(y=True)
-                for t in tech:
-                    tmp.plot(x1, t, )
             else:
-                for t in tech:
-                    p1.plot(x1, t)
-
-    vol = pg.BarGraphItem(x=x1, width=width1, height=df.volume, brushes=brushes)
-    p3.addItem(vol)
-
-    bg3 = pg.BarGraphItem(x=x1, y0=df.open, y1=df.close, width=width1, brushes=brushes)
-    bg4 = pg.BarGraphItem(x=x1, y0=df.low, y1=df.high, width=width2, brushes=brushes)
-    p2.addItem(bg3)
-    p2.addItem(bg4)
-
-    def update():
-        region.setZValue(10)
-        minX, maxX = region.getRegion()
+                tmp = self.p1
+            for t in tech:
+                if isinstance(t, Indicator):
+                    for i, line in enumerate(t.lines):
+                        self._indicator_curves.append((self._plot_curve(tmp, x, line), t, i))
+                else:
+                    self._static_curves.append((self._plot_curve(tmp, x, t), t))
+
+    @staticmethod
+    def _plot_curve(plot, x, y):
+        # technicals are x-sorted lines: clip to the view and downsample each curve, not the
+        # whole PlotItem, which would do the same to the order markers on p1
+        curve = plot.plot(x, y)
+        curve.setClipToView(True)
+        curve.setDownsampling(auto=True, method='peak')
+        return curve
+
+    def set_orders(self, orders, index=None, realign=False):
+        """ Replace the orders table; `index` is its OrderIndex if already built.
+
+        Orders are aligned to the bars once here unless they already are;
+        realign=True redoes it, e.g. for new bars.
+        """
+        if orders is not None and not orders.empty and (realign or not is_aligned(orders)):
+            orders = align_orders(self.bars, orders, step=self.time_index.step,
+                                  gap_factor=self.time_index.gap_factor)
+            index = None
+        self.p1.set_orders(orders, index)
+        self._labels.clear()
+        self.p1.update_orders()
+
+    def save_snapshot(self, path):
+        """ Save the bars, aligned orders and technicals shown, see snapshot.save_snapshot.
+
+        Refuses while the chart is not fully loaded, so a partial or failed load
+        never overwrites a good snapshot; returns None then.
+        """
+        if not self.loaded or not len(self.bars):
+            return None
+        return save_snapshot(path, self.bars, self.p1.orders, self.technicals)
+
+    def _set_loaded(self):
+        self.loaded = True
+
+    def load(self, loader):
+        """ Fill the chart from a background.ChartLoader as its results arrive. """
+        self.loader = loader
+        self.loaded = False
+        # do not let the window take the worker thread down while it runs; a lambda, so stop()
+        # runs in the GUI thread rather than queued to the (busy) loader's thread
+        self.main_window.closed.connect(lambda: loader.stop())
+        loader.bars_ready.connect(self.set_bars)
+        loader.orders_ready.connect(lambda result: self.set_orders(*result))
+        loader.technicals_ready.connect(lambda technicals: self.add_technicals(technicals, batched=True))
+        # queued after every result, so all of them are in the chart when this arrives
+        loader.loaded.connect(self._set_loaded)
+        loader.start()
+
+    @profiled('region')
+    def update(self):
+        length = len(self.bars)
+        self.region.setZValue(10)
+        minX, maxX = self.region.getRegion()
         iminX = int(minX)
         if iminX < 0:
             iminX = 0
         imaxX = int(maxX)
         if imaxX < 0:
-            imaxX = 0.1 * length
+            imaxX = int(0.1 * length)
 
         if imaxX > length:
             imaxX = length
         if iminX > length:
-            iminX = length * 0.9
-        tmp = df[iminX:imaxX]
+            iminX = int(length * 0.9)
 
-        p1.setXRange(minX, maxX, padding=0)
-        p1.setYRange(tmp.low.min(), tmp.high.max(), padding=0)
-        p3.setYRange(0, tmp.volume.max(), padding=0)
+        self.p1.setXRange(minX, maxX, padding=0)
+        if iminX < imaxX:
+            self.p1.setYRange(self.pyramid.range_low(iminX, imaxX), self.pyramid.range_high(iminX, imaxX), padding=0)
+            self.p3.setYRange(0, self.pyramid.range_volume(iminX, imaxX), padding=0)
 
-    region.sigRegionChanged.connect(update)
-
-    def updateRegion(window, viewRange):
+    @profiled('range')
+    def update_region(self, window, viewRange):
         rgn = viewRange[0]
-        region.setRegion(rgn)
-
-    p1.sigRangeChanged.connect(updateRegion)
-
-    region.setRegion([0.1 * length, 0.2 * length])
-    p1.set_region(region, 10)
+        self.region.setRegion(rgn)
+
+    def readout(self, index):
+        """ Crosshair label of bar `index`, formatted once and cached. """
+        text = self._labels.get(index)
+        if text is None:
+            bars = self.bars
+            text = "%s  <span style='color: red'>open=%0.1f, <span style='color: red'>high=%0.1f</span>, <span style='color: red'>low=%0.1f</span>,  <span style='color: red'>close=%0.1f</span>,   <span style='color: red'>volume=%0.1f</span>" % (
+                self.time_index.format(index),
+                bars.open[index], bars.high[index], bars.low[index], bars.close[index], bars.volume[index])
+            order = self.p1.order_near(index)
+            if order is not None:
+                text += ",   <span style='color: blue'>%s entry=%0.1f, exit=%0.1f, pnl=%0.1f</span>" % (
+                    ('long' if order[0] > 0 else 'short',) + order[1:])
+            if len(self._labels) >= 4096:
+                self._labels.clear()
+            self._labels[index] = text
+        return text
+
+    @profiled('hover')
+    def mouse_moved(self, evt):
+        pos = evt[0]  ## using signal proxy turns original arguments into a tuple
+        if self.p1.sceneBoundingRect().contains(pos):
+            mousePoint = self.p1.vb.mapSceneToView(pos)
+            index = int(mousePoint.x())
+            if index > 0 and index < len(self.bars):
+                self.label.setText(self.readout(index))
+            self.vLine.setPos(mousePoint.x())
+            self.hLine.setPos(mousePoint.y())
+
+    def set_bars(self, df):
+        """ Replace the bar series, e.g. by another interval, keeping the visible time window. """
+        window = None
+        if len(self.bars):
+            window = self.time_index.to_time(self.p1.vb.viewRange()[0])
+
+        self.bars = bars = as_bars(df)
+        self.time_index.reset(bars)
+        self.pyramid = bars.pyramid
+        for item in (self.candles, self.volume, self.overview):
+            item.set_pyramid(self.pyramid)
+        orders, index = self.p1.orders, self.p1.index
+        if is_aligned(orders):
+            # the fills move to the new bars by time; rows, flags and the filter index stay
+            index.orders = remap_orders(bars, index.orders)
+            orders = remap_orders(bars, orders)
+        self.set_orders(orders, index)
+
+        if len(self.indicators):
+            self.indicators.batch(bars)
+            self._update_curves()
+        x = np.arange(len(bars))
+        for curve, values in self._static_curves:
+            # plain arrays belong to the series they were given with
+            if len(values) == len(bars):
+                curve.setData(x, values)
+            else:
+                curve.setData([], [])
 
-    # cross hair
-    vLine = pg.InfiniteLine(angle=90, movable=False)
-    hLine = pg.InfiniteLine(angle=0, movable=False)
-    p1.addItem(vLine, ignoreBounds=True)
-    p1.addItem(hLine, ignoreBounds=True)
+        if window is None:
+            self.region.setRegion([0, len(bars)])
+        else:
+            i0, i1 = self.time_index.to_index(window)
+            self.region.setRegion([i0, max(i1, i0 + 1)])
+
+    def append_bar(self, datetime, open, high, low, close, volume):
+        """ Append a bar at the right edge; datetime is anything np.datetime64 accepts. """
+        self.bars.append(to_epoch_ns(datetime), open, high, low, close, volume)
+        self._tail_changed(True)
+
+    def update_last_bar(self, high, low, close, volume):
+        self.bars.update_last(high, low, close, volume)
+        self._tail_changed(False)
+
+    def add_orders(self, orders):
+        """ Add closed trades (same columns as the orders table) and redraw the markers. """
+        if orders.empty:
+            return
+        # only the new trades are aligned, to the bars as they are now
+        self.set_orders(add_orders(self.bars, self.p1.orders, orders, step=self.time_index.step,
+                                   gap_factor=self.time_index.gap_factor))
+
+    @profiled('tail')
+    def _tail_changed(self, new_bar):
+        self._labels.pop(len(self.bars) - 1, None)
+        for item in (self.candles, self.volume, self.overview):
+            item.tail_changed(new_bar)
+        if len(self.indicators):
+            self.indicators.update(self.bars, replace=not new_bar)
+            if not self._curves_pending:
+                # coalesce a burst of bars into one curve update
+                self._curves_pending = True
+                QtCore.QTimer.singleShot(0, self._update_curves)
+        left, right = self.region.getRegion()
+        length = len(self.bars)
+        if new_bar and right >= length - 2:
+            # the window is at the tail, keep following it
+            self.region.setRegion([left + 1, right + 1])
+        elif right >= length - 1:
+            self.update()
+
+    @profiled('curves')
+    def _update_curves(self):
+        self._curves_pending = False
+        x = np.arange(len(self.bars))
+        for curve, indicator, i in self._indicator_curves:
+            curve.setData(x, indicator.line(i))
+
+    def follow(self, feed, interval=100, max_messages=1000):
+        """ Poll a queue of ('bar', bar) / ('orders', DataFrame) messages from the GUI thread.
+
+        A bar is a (datetime, open, high, low, close, volume) tuple; a bar with
+        the same datetime as the last one replaces it.
+        """
+
+        def poll():
+            for _ in range(max_messages):
+                try:
+                    kind, value = feed.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'bar':
+                    dt = to_epoch_ns(value[0])
+                    if len(self.bars) and dt == self.bars.datetime[-1]:
+                        self.update_last_bar(*value[2:])
+                    else:
+                        self.append_bar(*value)
+                elif kind == 'orders':
+                    self.add_orders(value)
+
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(poll)
+        self._timer.start(interval)
+
+    def show(self):
+        self.main_window.show()
+
+    def close(self):
+        """ Close the window and release its Qt objects, e.g. after an offscreen render. """
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self.main_window.close()
+        self.main_window.deleteLater()
 
-    vb = p1.vb
 
-    def mouseMoved(evt):
-        pos = evt[0]  ## using signal proxy turns original arguments into a tuple
-        if p1.sceneBoundingRect().contains(pos):
-            mousePoint = vb.mapSceneToView(pos)
-            index = int(mousePoint.x())
-            if index > 0 and index < len(df):
-                label.setText(
-                    "<span style='color: red'>open=%0.1f, <span style='color: red'>high=%0.1f</span>, <span style='color: red'>low=%0.1f</span>,  <span style='color: red'>close=%0.1f</span>,   <span style='color: red'>volume=%0.1f</span>" % (
-                        df.iloc[index].open, df.iloc[index].high, df.iloc[index].low, df.iloc[index].close,
-                        df.iloc[index].volume))
-            vLine.setPos(mousePoint.x())
-            hLine.setPos(mousePoint.y())
+def plot_trade(df, *args, **kwargs):
+    """ Plot bars and orders.
 
-    proxy = pg.SignalProxy(p1.scene().sigMouseMoved, rateLimit=60, slot=mouseMoved)
-    main_window.show()
+    Args:
+      df: a bar DataFrame, or store.Bars (e.g. from store.open_store) to chart a memory-mapped bar store,
+        or a ticks.TickSeries to chart ticks resampled to the zoom level,
+        or a snapshot.Snapshot (from open_snapshot) whose orders and technicals are the defaults
+      interval: for a TickSeries, 'auto' or one of its interval labels, e.g. '1min'
+      orders: an orders DataFrame with volume, entryDt, entryPrice, exitDt, exitPrice, pnl
+      technicals: a list of (name, type, [list of tech]) tuples, tech being arrays or indicators.Indicator
+      feed: an optional queue of live bars and orders, see TradeChart.follow
+      background: show the window at once and load in a worker thread, see background.ChartLoader;
+        df and orders may then be callables, technicals a callable technicals(bars, orders)
+      profile: True to time the callbacks and show a frame-time overlay; a path also
+        writes a Chrome trace there when the window closes
+    """
+    if isinstance(df, Snapshot):
+        kwargs.setdefault('orders', df.orders)
+        kwargs.setdefault('technicals', df.technicals)
+        df = df.bars
+    feed = kwargs.pop('feed', None)
+    profile = kwargs.pop('profile', False)
+    interval = kwargs.pop('interval', 'auto')
+    series = None
+    if isinstance(df, TickSeries):
+        # start from the coarsest interval, the selector then follows the zoom
+        series, df = df, df.resample(df.intervals[-1][1])
+    orders = kwargs.pop('orders', None)
+    technicals = kwargs.pop('technicals', None)
+    if kwargs.pop('background', False):
+        chart = TradeChart(Bars.empty(), profile=bool(profile))
+        chart.load(ChartLoader(df, orders, technicals))
+    else:
+        chart = TradeChart(df, orders=orders, technicals=technicals, profile=bool(profile))
+    if series is not None:
+        chart.interval_selector = IntervalSelector(chart, series, interval)
+    if feed is not None:
+        chart.follow(feed)
+    chart.show()
 
     import sys
     if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
-        QtGui.QApplication.instance().exec_()
\ No newline at end of file
+        QtGui.QApplication.instance().exec_()
+        if profile and profile is not True:
+            profiler.export_trace(profile)
+    return chart
@@ -9,10 +9,13 @@ from __future__ import division
 from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine, MINUTE_DB_NAME
 import pandas as pd
 from utils import plot_candles, plot_trade
-import talib
+from data import load_store
+from indicators import ATR, RSI, SMA, Greater
+from analytics import trade_technicals
 import numpy as np
 
-if __name__ == '__main__':
+
+def backtest():
     from vnpy.trader.app.ctaStrategy.strategy.strategyAtrRsi import AtrRsiStrategy
 
     # 创建回测引擎
@@ -38,33 +41,35 @@ if __name__ == '__main__':
     d = {'rsiLength': 10, 'atrLength': 10, 'rsiEntry':27}
     engine.initStrategy(AtrRsiStrategy, d)
 
-    engine.loadHistoryData()
-
-    # 开始跑回测
-
-    engine.loadHistoryData()
-
+    # 开始跑回测（runBacktesting内部会载入历史数据）
     engine.runBacktesting()
 
     # 显示回测结果
     engine.showBacktestingResult(d)
 
     # analysis
-    engine.loadHistoryData()
+    return pd.DataFrame([i.__dict__ for i in engine.calculateBacktestingResult()['resultList']])
 
-    orders = pd.DataFrame([i.__dict__ for i in engine.calculateBacktestingResult()['resultList']])
-
-    pricing = pd.DataFrame(list(engine.dbCursor))
-
-    atr = np.nan_to_num(talib.ATR(pricing.high.values, pricing.low.values, pricing.close.values, 25))
-
-    atr_ma = np.nan_to_num(pd.DataFrame(atr).rolling(25).mean()[0].values)
 
+def make_technicals(pricing, orders):
     # 每个子图一个tuple: (name, type, [list of tech]), type为0则画在主图（k线图）上，1，则画在子图上。
-    # [list of tech]，每个元素长度要和k线相同
+    # [list of tech]，每个元素为长度和k线相同的数组，或者indicators中的指标对象
+    length = len(pricing)
+    atr = ATR(25)
+    technicals = [('rsi', 1, [RSI(4), np.full(length, 50 - 16), np.full(length, 50 + 16)]),
+                  ('atr', 1, [Greater(atr, SMA(25, source=atr))])]
+    technicals += trade_technicals(pricing, orders)
+    return technicals
 
-    length = pricing.shape[0]
-    technicals = [('rsi', 1, [talib.RSI(pricing.close.values, 4), np.full(length,50-16), np.full(length,50+16)]),
-                  ('atr', 1,[np.greater(atr, atr_ma).astype(int)])]
 
-    plot_trade(pricing, volume_bars=True, orders=orders, technicals=technicals)
+if __name__ == '__main__':
+    # 行情只从数据库读一次，之后从本地缓存读取
+    def pricing():
+        return load_store(MINUTE_DB_NAME, 'rb0000', '20160601')
+
+    # 窗口立即显示，行情、回测和指标在后台线程中完成后依次画上，k线先画最近的一段
+    # 关闭窗口时，如果已经全部载入完成，保存快照，之后 python snapshot.py rb0000.aosnap 直接打开，不需要重新回测；
+    # 载入未完成或失败时不保存，不会覆盖之前的快照
+    chart = plot_trade(pricing, volume_bars=True, orders=backtest, technicals=make_technicals, background=True)
+    if chart.save_snapshot('rb0000.aosnap') is None:
+        print(u'载入未完成，未保存快照')
@@ -0,0 +1,156 @@
+# encoding: UTF-8
+
+from collections import OrderedDict
+from functools import partial
+
+from pyqtgraph.Qt import QtCore, QtGui
+
+from store import as_bars
+from utils import TradeChart
+
+
+class BarCache(object):
+    """ LRU of loaded bar series, bounded by the total number of bars.
+
+    `loader(symbol)` returns a bar DataFrame or store.Bars. Series of open
+    charts are pinned and never evicted.
+    """
+
+    def __init__(self, loader, max_bars=20 * 10 ** 6):
+        self.loader = loader
+        self.max_bars = max_bars
+        self._bars = OrderedDict()
+
+    def __contains__(self, symbol):
+        return symbol in self._bars
+
+    def get(self, symbol, pinned=()):
+        bars = self._bars.pop(symbol, None)
+        if bars is None:
+            bars = as_bars(self.loader(symbol))
+        self._bars[symbol] = bars
+        self._evict(set(pinned) | {symbol})
+        return bars
+
+    def _evict(self, pinned):
+        total = sum(len(bars) for bars in self._bars.values())
+        for symbol in list(self._bars):
+            if total <= self.max_bars:
+                break
+            if symbol not in pinned:
+                total -= len(self._bars.pop(symbol))
+
+
+def _lookup(source, symbol, *args):
+    # per-symbol settings are a dict, a callable or None
+    if source is None:
+        return None
+    if callable(source):
+        return source(symbol, *args)
+    return source.get(symbol)
+
+
+class Workspace(object):
+    """ Many symbols in tabs, each tab a tile grid of `per_tab` linked charts.
+
+    A tab's charts are built the first time it is shown; only the `keep_tabs`
+    most recently shown tabs keep their charts, and the bars themselves live
+    in a shared BarCache. Charts are linked by time: scrolling one shows the
+    same time window in the others, mapped through their own timestamps.
+
+    Args:
+      symbols: the symbols, in tab order
+      loader: loader(symbol) -> bar DataFrame or store.Bars
+      orders: {symbol: orders} or orders(symbol)
+      technicals: {symbol: technicals} or technicals(symbol, bars), see plot_trade
+    """
+
+    def __init__(self, symbols, loader, orders=None, technicals=None, per_tab=1, columns=2, keep_tabs=3,
+                 max_bars=20 * 10 ** 6):
+        self.symbols = list(symbols)
+        self.cache = BarCache(loader, max_bars)
+        self.orders = orders
+        self.technicals = technicals
+        self.columns = columns
+        self.keep_tabs = keep_tabs
+        self.pages = [self.symbols[i:i + per_tab] for i in range(0, len(self.symbols), per_tab)]
+        self.charts = {}
+        self._recent = []
+        self._time_range = None
+        self._syncing = False
+
+        self.tabs = QtGui.QTabWidget()
+        for page in self.pages:
+            widget = QtGui.QWidget()
+            QtGui.QGridLayout(widget)
+            self.tabs.addTab(widget, ', '.join(page))
+        self.tabs.currentChanged.connect(self.open_page)
+        self.open_page(self.tabs.currentIndex())
+
+    def open_page(self, page):
+        if page < 0:
+            return
+        if page not in self.charts:
+            layout = self.tabs.widget(page).layout()
+            pinned = [symbol for p in self._recent for symbol in self.pages[p]] + self.pages[page]
+            charts = []
+            for k, symbol in enumerate(self.pages[page]):
+                bars = self.cache.get(symbol, pinned)
+                chart = TradeChart(bars, orders=_lookup(self.orders, symbol),
+                                   technicals=_lookup(self.technicals, symbol, bars))
+                layout.addWidget(chart.main_window, k // self.columns, k % self.columns)
+                chart.p1.sigXRangeChanged.connect(partial(self._range_changed, chart))
+                charts.append(chart)
+            self.charts[page] = charts
+            if self._time_range is not None:
+                self._sync(None, *self._time_range)
+
+        if page in self._recent:
+            self._recent.remove(page)
+        self._recent.append(page)
+        while len(self._recent) > self.keep_tabs:
+            self._close_page(self._recent.pop(0))
+
+    def _close_page(self, page):
+        # the bars stay in the cache until it needs the room
+        for chart in self.charts.pop(page):
+            chart.main_window.setParent(None)
+            chart.main_window.deleteLater()
+
+    def _range_changed(self, chart, viewbox, view_range):
+        if self._syncing:
+            return
+        if not len(chart.bars):
+            return
+        self._time_range = tuple(chart.time_index.to_time(view_range))
+        self._sync(chart, *self._time_range)
+
+    def _sync(self, source, start, stop):
+        """ Show the epoch-ns window start..stop in every open chart but source. """
+        self._syncing = True
+        try:
+            for charts in self.charts.values():
+                for chart in charts:
+                    if chart is source:
+                        continue
+                    i, j = chart.time_index.to_index([start, stop])
+                    if i < j:
+                        chart.p1.setXRange(i, j, padding=0)
+        finally:
+            self._syncing = False
+
+    def show(self):
+        self.tabs.resize(1600, 1000)
+        self.tabs.show()
+
+
+def plot_workspace(symbols, loader, **kwargs):
+    """ Open a Workspace (see its arguments) and run the Qt event loop. """
+    app = QtGui.QApplication.instance() or QtGui.QApplication([])
+    workspace = Workspace(symbols, loader, **kwargs)
+    workspace.show()
+
+    import sys
+    if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
+        app.exec_()
+    return workspace
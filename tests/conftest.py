@@ -0,0 +1,7 @@
+# encoding: UTF-8
+
+import os
+import sys
+
+# the aorder modules import each other by their plain names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aorder'))
@@ -0,0 +1,66 @@
+# encoding: UTF-8
+
+import numpy as np
+import pandas as pd
+
+from align import ALIGN_COLUMNS, add_orders, align_orders, bar_interval, is_aligned, is_gap
+from store import Bars, to_epoch_ns
+from synthetic import synthetic_bars, synthetic_orders
+
+
+def minute_bars(times):
+    datetime = to_epoch_ns(pd.to_datetime(times).values)
+    n = len(datetime)
+    return Bars(datetime, *[np.full(n, value, dtype=np.float32) for value in (10, 12, 8, 11)] +
+                [np.ones(n, dtype=np.int64)])
+
+
+def test_gap_flags_follow_the_axis_rule():
+    # minute bars up to 11:29, a missing bar (2 steps apart is a gap), 11:31, then lunch until 13:30
+    bars = minute_bars(['2016-06-01 11:25', '2016-06-01 11:26', '2016-06-01 11:27', '2016-06-01 11:28',
+                        '2016-06-01 11:29', '2016-06-01 11:31', '2016-06-01 13:30', '2016-06-01 13:31'])
+    step = bar_interval(bars.datetime)
+    assert step == 60 * 10 ** 9
+    orders = pd.DataFrame({
+        'volume': [1, 1, 1, 1],
+        'entryDt': pd.to_datetime(['2016-06-01 11:28:30', '2016-06-01 11:30:10', '2016-06-01 12:00:00',
+                                   '2016-06-01 11:24:00']),
+        'entryPrice': [11.0, 11.0, 11.0, 11.0],
+        'exitDt': pd.to_datetime(['2016-06-01 13:31:30', '2016-06-01 13:32:00', '2016-06-01 13:31:00',
+                                  '2016-06-01 11:29:00']),
+        'exitPrice': [11.0, 11.0, 13.0, 11.0],
+    })
+    aligned = align_orders(bars, orders)
+    np.testing.assert_array_equal(aligned.entryBar.values, [3, 4, 5, 0])
+    np.testing.assert_array_equal(aligned.entryInGap.values, [False, True, True, False])
+    np.testing.assert_array_equal(aligned.entryOutOfRange.values, [False, False, False, True])
+    np.testing.assert_array_equal(aligned.exitOutOfRange.values, [False, True, False, False])
+    np.testing.assert_array_equal(aligned.exitPriceOutside.values, [False, False, True, False])
+    np.testing.assert_array_equal(aligned.badFill.values, [False, True, True, True])
+
+    # a looser gap rule no longer counts the missing bar as a gap
+    aligned = align_orders(bars, orders, step=step, gap_factor=2.5)
+    np.testing.assert_array_equal(aligned.entryInGap.values, [False, False, True, False])
+    assert is_gap(2 * step, step) and not is_gap(2 * step, step, 2.5)
+
+
+def test_live_orders_added_to_aligned_orders():
+    df = synthetic_bars(1000, seed=10)
+    bars = Bars.from_frame(df)
+    orders = synthetic_orders(df, 40, seed=11)
+    aligned = align_orders(bars, orders.iloc[:30])
+    new = orders.iloc[30:]
+
+    # a raw concat leaves the new rows unaligned
+    assert not is_aligned(pd.concat([aligned, new], ignore_index=True))
+
+    merged = add_orders(bars, aligned, new)
+    assert is_aligned(merged) and len(merged) == 40
+    assert merged.entryBar.dtype.kind == 'i'
+    for column in ALIGN_COLUMNS[2:]:
+        assert merged[column].dtype == bool
+    expected = align_orders(bars, orders)
+    for column in ALIGN_COLUMNS:
+        np.testing.assert_array_equal(merged[column].values, expected[column].values)
+    # what the chart computes for its bad-fill markers
+    assert not (merged.entryOutOfRange.values | merged.entryInGap.values | merged.entryPriceOutside.values).any()
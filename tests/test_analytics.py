@@ -0,0 +1,42 @@
+# encoding: UTF-8
+
+import numpy as np
+import pandas as pd
+
+from analytics import pnl_by_hour, streaks, trade_technicals
+from store import Bars
+from synthetic import synthetic_bars, synthetic_orders
+
+
+def test_streaks_zero_pnl_breaks_both():
+    signed, longest_win, longest_loss = streaks([5, 3, 0, 2, -1, -4, 0, 0, -2, 1])
+    np.testing.assert_array_equal(signed, [2, 2, 0, 1, -2, -2, 0, 0, -1, 1])
+    assert (longest_win, longest_loss) == (2, 2)
+    assert streaks([0, 0])[1:] == (0, 0)
+
+
+def test_trade_technicals_panes():
+    df = synthetic_bars(3000, seed=6)
+    bars = Bars.from_frame(df)
+    orders = synthetic_orders(df, 200, seed=7)
+    technicals = trade_technicals(bars, orders)
+    assert [name for name, _, _ in technicals] == ['equity', 'drawdown', 'mae/mfe', 'holding time', 'pnl by hour',
+                                                   'pnl by weekday']
+    for _, type, tech in technicals:
+        assert type == 1
+        for values in tech:
+            assert len(values) == len(bars)
+            assert np.isfinite(values).all()
+
+    by_hour = dict((name, tech[0]) for name, _, tech in technicals)['pnl by hour']
+    hours = (bars.datetime // (3600 * 10 ** 9)) % 24
+    np.testing.assert_allclose(by_hour, pnl_by_hour(orders)[hours])
+    holding = dict((name, tech[0]) for name, _, tech in technicals)['holding time']
+    assert holding.max() <= 60 and holding[-1] > 0
+
+
+def test_trade_technicals_without_trades():
+    bars = Bars.from_frame(synthetic_bars(100, seed=6))
+    # what a backtest without trades gives: no columns at all
+    assert trade_technicals(bars, pd.DataFrame([])) == []
+    assert trade_technicals(bars, None) == []
@@ -0,0 +1,72 @@
+# encoding: UTF-8
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+from data import BAR_COLUMNS, cache_path, load_bars, store_path
+from store import open_store
+
+
+def bar(dt, price=3000.0):
+    return {'datetime': dt, 'open': price, 'high': price + 2, 'low': price - 2, 'close': price + 1,
+            'volume': 10, 'openInterest': 100, 'vtSymbol': 'rb0000', 'date': dt.strftime('%Y%m%d')}
+
+
+@pytest.fixture
+def client():
+    client = mongomock.MongoClient()
+    start = datetime(2016, 6, 1, 21, 0)
+    records = [bar(start + timedelta(hours=i), 3000.0 + i) for i in range(30)]
+    client['VnTrader_1Min_Db']['rb0000'].insert_many(records)
+    return client
+
+
+class NoMongo(object):
+    def __getitem__(self, name):
+        raise AssertionError('Mongo queried although the cache exists')
+
+
+def test_cache_key(tmp_path):
+    path = cache_path('db', 'rb0000', '20160601', '20160602', str(tmp_path))
+    assert path == os.path.join(str(tmp_path), 'db_rb0000_20160601_20160602.npz')
+    # open-ended ranges are keyed by today, so they are re-read once per day
+    today = datetime.now().strftime('%Y%m%d')
+    assert cache_path('db', 'rb0000', '20160601', cache_dir=str(tmp_path)).endswith('_20160601_to' + today + '.npz')
+
+
+def test_cache_hit_skips_mongo(client, tmp_path):
+    df = load_bars('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', client=client, cache_dir=str(tmp_path))
+    assert os.path.exists(cache_path('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', str(tmp_path)))
+    cached = load_bars('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', client=NoMongo(),
+                       cache_dir=str(tmp_path))
+    assert list(cached.columns) == BAR_COLUMNS
+    np.testing.assert_array_equal(cached.datetime.values, df.datetime.values)
+    np.testing.assert_array_equal(cached.close.values, df.close.values)
+
+
+def test_end_date_is_inclusive(client):
+    df = load_bars('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', client=client, cache_dir=None)
+    # 21:00 on the 1st up to 23:00 on the 2nd, nothing of the 3rd
+    assert len(df) == 27
+    assert df.datetime.iloc[0] == datetime(2016, 6, 1, 21, 0)
+    assert df.datetime.iloc[-1] == datetime(2016, 6, 2, 23, 0)
+
+
+def test_dtypes(client):
+    df = load_bars('VnTrader_1Min_Db', 'rb0000', '20160601', client=client, cache_dir=None)
+    assert list(df.columns) == BAR_COLUMNS
+    assert df.datetime.dtype == np.dtype('datetime64[ns]')
+    for name in BAR_COLUMNS[1:]:
+        assert df[name].dtype == np.float64
+
+
+def test_store_path(client, tmp_path):
+    path = store_path('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', str(tmp_path), client=client)
+    bars = open_store(path)
+    assert len(bars) == 27
+    assert store_path('VnTrader_1Min_Db', 'rb0000', '20160601', '20160602', str(tmp_path), client=NoMongo()) == path
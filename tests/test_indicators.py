@@ -0,0 +1,44 @@
+# encoding: UTF-8
+
+import numpy as np
+import pytest
+
+from indicators import ATR, EMA, RSI, SMA, BollingerBands, Greater, IndicatorSet
+from store import Bars
+from synthetic import synthetic_bars
+
+
+def make_indicators():
+    sma = SMA(10)
+    return [sma, EMA(12), RSI(14), ATR(14), BollingerBands(20), Greater(sma, EMA(30))]
+
+
+@pytest.fixture
+def bars():
+    return Bars.from_frame(synthetic_bars(500, seed=3))
+
+
+def test_replace_after_batch_rolls_back(bars, monkeypatch):
+    indicators = make_indicators()
+    live = IndicatorSet(indicators)
+    live.batch(bars)
+    for indicator in live:
+        # a forming bar must not fall back to recomputing the history
+        monkeypatch.setattr(indicator, 'batch', lambda bars: pytest.fail('re-batched'))
+
+    rng = np.random.RandomState(4)
+    for _ in range(5):
+        close = bars.close[-1] + rng.randint(-3, 4)
+        bars.update_last(max(bars.high[-1], close), min(bars.low[-1], close), close, bars.volume[-1] + 1)
+        live.update(bars, replace=True)
+    bars.append(bars.datetime[-1] + 60 * 10 ** 9, bars.close[-1], bars.close[-1] + 2, bars.close[-1] - 1,
+                bars.close[-1] + 1, 10)
+    live.update(bars)
+    bars.update_last(bars.high[-1] + 1, bars.low[-1], bars.close[-1] + 1, 20)
+    live.update(bars, replace=True)
+
+    expected = IndicatorSet(make_indicators())
+    expected.batch(bars)
+    for indicator, reference in zip(live, expected):
+        assert len(indicator) == len(bars)
+        np.testing.assert_allclose(indicator.values, reference.values, rtol=1e-9, atol=1e-9)
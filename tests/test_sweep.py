@@ -0,0 +1,99 @@
+# encoding: UTF-8
+
+import os
+from functools import partial
+
+import pytest
+
+from store import open_store, write_store
+from sweep import bar_records, grid, history_range, run_sweep
+from synthetic import synthetic_bars
+
+
+class StubStrategy(object):
+    pass
+
+
+class StubEngine(object):
+    """ Just enough of vnpy's BacktestingEngine for run_backtest; logs every run to `log_dir`. """
+
+    BAR_MODE = 'bar'
+
+    def __init__(self, log_dir, store):
+        self.log_dir = log_dir
+        self.store = store
+        self.setting = {}
+
+    def setBacktestingMode(self, mode):
+        self.mode = mode
+
+    def setStartDate(self, start_date, init_days=10):
+        self.setting['startDate'] = (start_date, init_days)
+
+    def setSlippage(self, slippage):
+        self.setting['slippage'] = slippage
+
+    def initStrategy(self, cls, params):
+        assert cls is StubStrategy
+        self.params = params
+
+    def runBacktesting(self):
+        name = '_'.join('{}{}'.format(k, v) for k, v in sorted(self.params.items()))
+        with open(os.path.join(self.log_dir, name), 'a') as f:
+            f.write('run\n')
+
+    def calculateBacktestingResult(self):
+        capital = self.params['fast'] * 10 - self.params['slow'] - self.setting['slippage']
+        return {'capital': capital, 'totalResult': len(open_store(self.store)), 'resultList': []}
+
+
+def runs_logged(log_dir):
+    return sorted(os.listdir(log_dir))
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    return write_store(str(tmp_path_factory.mktemp('store') / 'rb0000.bars'), synthetic_bars(500, seed=5))
+
+
+def test_history_range(store):
+    bars = open_store(store)
+    start, split, stop = history_range(bars, '2016-06-01 09:10', '2016-06-01 10:00', '2016-06-01 11:00')
+    assert (start, split, stop) == (10, 60, 121)
+    assert history_range(bars, '2016-06-01', '2016-06-01 10:00') == (0, 60, len(bars))
+    records = list(bar_records(bars, start, split, 'rb0000'))
+    assert len(records) == 50
+    assert records[0]['datetime'].strftime('%H:%M') == '09:10'
+    assert records[0]['vtSymbol'] == 'rb0000'
+
+
+def test_run_sweep_memo_and_sort(store, tmp_path):
+    log_dir = str(tmp_path / 'log')
+    cache_dir = str(tmp_path / 'cache')
+    os.makedirs(log_dir)
+    factory = partial(StubEngine, log_dir)
+    setting = {'startDate': ('20160601', 0), 'slippage': 1}
+
+    params_list = grid({'fast': [1, 3], 'slow': [5]})
+    runs = run_sweep(StubStrategy, params_list, store, setting, 2, cache_dir=cache_dir, engine_factory=factory)
+    assert [run['params'] for run in runs] == [{'fast': 3, 'slow': 5}, {'fast': 1, 'slow': 5}]
+    assert [run['summary']['capital'] for run in runs] == [24, 4]
+    assert runs[0]['summary']['totalResult'] == 500
+    assert runs_logged(log_dir) == ['fast1_slow5', 'fast3_slow5']
+
+    # the two cached runs are not run again, only the new combination is
+    params_list = grid({'fast': [1, 2, 3], 'slow': [5]})
+    runs = run_sweep(StubStrategy, params_list, store, setting, 2, cache_dir=cache_dir, engine_factory=factory)
+    assert [run['summary']['capital'] for run in runs] == [24, 14, 4]
+    for name in runs_logged(log_dir):
+        with open(os.path.join(log_dir, name)) as f:
+            assert f.read() == 'run\n'
+    assert runs_logged(log_dir) == ['fast1_slow5', 'fast2_slow5', 'fast3_slow5']
+
+    # another setting is another cache key
+    runs = run_sweep(StubStrategy, params_list, store, dict(setting, slippage=2), 2, cache_dir=cache_dir,
+                     engine_factory=factory)
+    assert [run['summary']['capital'] for run in runs] == [23, 13, 3]
+    with open(os.path.join(log_dir, 'fast2_slow5')) as f:
+        assert f.read() == 'run\nrun\n'
+
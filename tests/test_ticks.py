@@ -0,0 +1,50 @@
+# encoding: UTF-8
+
+import numpy as np
+import pandas as pd
+
+from align import align_orders, remap_orders
+from synthetic import synthetic_orders
+from ticks import NS_PER_SECOND, TickSeries, resample_bars, write_tick_store
+
+
+def tick_chunks(n, chunksize, seed=8):
+    rng = np.random.RandomState(seed)
+    start = np.datetime64('2016-06-01T09:00:00', 'ns').astype(np.int64)
+    times = start + np.cumsum(rng.randint(1, 2 * NS_PER_SECOND, n))
+    price = 3000 + np.cumsum(rng.randint(-1, 2, n)).astype(np.float64)
+    volume = np.cumsum(rng.randint(0, 10, n))
+    for i in range(0, n, chunksize):
+        yield times[i:i + chunksize].view('datetime64[ns]'), price[i:i + chunksize], volume[i:i + chunksize]
+
+
+def test_each_interval_streams_from_the_ticks(tmp_path):
+    path = write_tick_store(str(tmp_path / 'rb.ticks'), tick_chunks(20000, 3000))
+    series = TickSeries(path, chunksize=777)
+
+    minute = series.resample(60)
+    # the finer interval is not built on the way
+    assert list(series._bars) == [60]
+    assert series.resample(60) is minute
+
+    second = series.resample(1)
+    expected = resample_bars(second, 60 * NS_PER_SECOND)
+    for name in ('datetime', 'open', 'high', 'low', 'close', 'volume'):
+        np.testing.assert_array_equal(getattr(minute, name), getattr(expected, name))
+    assert minute.volume.sum() == second.volume.sum()
+
+
+def test_remap_orders_keeps_flags(tmp_path):
+    path = write_tick_store(str(tmp_path / 'rb.ticks'), tick_chunks(20000, 3000))
+    series = TickSeries(path)
+    coarse, fine = series.resample(300), series.resample(15)
+    frame = pd.DataFrame({'datetime': fine.datetime.view('datetime64[ns]'), 'close': fine.close})
+    orders = synthetic_orders(frame, 50, seed=9)
+    aligned = align_orders(coarse, orders)
+
+    remapped = remap_orders(fine, aligned)
+    for side in ('entry', 'exit'):
+        expected = fine.datetime.searchsorted(orders[side + 'Dt'].values.astype(np.int64), side='right') - 1
+        np.testing.assert_array_equal(remapped[side + 'Bar'].values, expected)
+    np.testing.assert_array_equal(remapped.badFill.values, aligned.badFill.values)
+
@@ -0,0 +1,27 @@
+# encoding: UTF-8
+
+import numpy as np
+
+from synthetic import synthetic_bars, synthetic_orders, write_trades_csv
+from trades import ORDER_COLUMNS, load_trades, parse_datetime
+
+
+def test_parse_datetime():
+    ns = parse_datetime(np.array(['20160601', '20160602']), np.array(['09:19:00', '21:00:30.5']))
+    expected = np.array(['2016-06-01T09:19:00', '2016-06-02T21:00:30.5'], dtype='datetime64[ns]')
+    np.testing.assert_array_equal(ns.view('datetime64[ns]'), expected)
+
+
+def test_round_trip(tmp_path):
+    bars = synthetic_bars(2000, seed=1)
+    orders = synthetic_orders(bars, 300, seed=2)
+    path = write_trades_csv(orders, str(tmp_path / 'trades.csv'))
+
+    loaded = load_trades(path, chunksize=128)
+    assert list(loaded.columns) == ORDER_COLUMNS
+    assert len(loaded) == len(orders)
+    for name in ('entryDt', 'exitDt'):
+        assert loaded[name].dtype == np.dtype('datetime64[ns]')
+        np.testing.assert_array_equal(loaded[name].values, orders[name].values.astype('datetime64[ns]'))
+    for name in ('volume', 'entryPrice', 'exitPrice', 'pnl', 'commission'):
+        np.testing.assert_allclose(loaded[name].values, orders[name].values)